@@ -1,17 +1,252 @@
 """
 AI服务：封装大模型调用
 """
+import functools
+import hashlib
+import inspect
 import json
 import logging
-from typing import Dict, List, Optional, Any
+import os
+import random
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Callable, Tuple
 from abc import ABC, abstractmethod
 
+try:
+    from .config import (
+        REDIS_URL, LLM_CACHE_ENABLED, LLM_CACHE_TTL_SECONDS, DEBUG_AI_DUMP, FILE_RETENTION_DAYS,
+        MESSAGE_BATCH_ENABLED, MESSAGE_BATCH_POLL_SECONDS, MESSAGE_BATCH_TIMEOUT_SECONDS
+    )
+except ImportError:
+    from config import (
+        REDIS_URL, LLM_CACHE_ENABLED, LLM_CACHE_TTL_SECONDS, DEBUG_AI_DUMP, FILE_RETENTION_DAYS,
+        MESSAGE_BATCH_ENABLED, MESSAGE_BATCH_POLL_SECONDS, MESSAGE_BATCH_TIMEOUT_SECONDS
+    )
+
+# orjson解析速度为标准库json的数倍；未安装时回退到json（orjson.JSONDecodeError 是 json.JSONDecodeError 的子类）
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 logger = logging.getLogger(__name__)
 
+# 结构化输出时强制模型调用的工具名
+_OUTPUT_TOOL_NAME = "emit_result"
+
+# 可重试的HTTP状态码（限流/服务端错误/网关错误/Anthropic过载）
+_RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 529})
+
+
+def _retry_with_backoff(func: Callable[[], Any], retryable: Tuple[type, ...] = (), max_retries: int = 5,
+                        service_name: str = "AI") -> Any:
+    """
+    以指数退避+随机抖动的方式重试调用
+
+    Args:
+        func: 无参可调用对象
+        retryable: 视为临时错误的异常类型
+        max_retries: 最大尝试次数
+        service_name: 用于日志的服务名称
+
+    Returns:
+        func的返回值
+    """
+    for attempt in range(max_retries):
+        try:
+            return func()
+        except Exception as e:
+            is_transient = isinstance(e, retryable) or getattr(e, "status_code", None) in _RETRYABLE_STATUS_CODES
+            if not is_transient or attempt >= max_retries - 1:
+                logger.error(f"{service_name} API调用失败: {e}")
+                raise
+            wait_time = min(60, random.uniform(1, 2) * (2 ** attempt))
+            logger.warning(f"{service_name} API调用失败({type(e).__name__})，{wait_time:.1f}秒后重试... (尝试 {attempt + 1}/{max_retries})")
+            time.sleep(wait_time)
+
+
+def _build_http_client(sdk):
+    """
+    创建带连接池配置的HTTP客户端（并发任务下保持TCP/TLS连接复用）
+
+    Args:
+        sdk: openai 或 anthropic 模块；Limits/Timeout/Client 均取自SDK自身，保证与其使用的httpx版本一致
+    """
+    client_cls = getattr(sdk, "DefaultHttpxClient", None)
+    if client_cls is None:
+        import httpx  # 旧版SDK直接使用httpx
+        client_cls = httpx.Client
+
+    limits_cls = type(sdk.DEFAULT_CONNECTION_LIMITS)
+    return client_cls(
+        limits=limits_cls(max_keepalive_connections=64, max_connections=128, keepalive_expiry=30),
+        timeout=sdk.Timeout(180.0, connect=10.0)
+    )
+
+
+# 仅删除多余的控制字符（保留 \t \n \r），AI输出中偶尔夹带的控制字符会导致解析失败
+# 中文引号不做替换：它们在JSON字符串值中是合法字符（如 "点击“提交”按钮"），换成英文引号反而会破坏JSON
+_CONTROL_CHARS_TABLE = str.maketrans({chr(c): None for c in range(0x20) if c not in (0x09, 0x0a, 0x0d)})
+_TRAIL_COMMA_RE = re.compile(r',(\s*[\]}])')
+_JSON_FENCE_RE = re.compile(r'```(?:json)?\s*(\{.*?\})\s*```', re.S)
+
+
+def _cleanup_json(json_str: str) -> str:
+    """清理JSON字符串中的常见错误"""
+    # 1. 移除多余的控制字符（str.translate 单次遍历完成）
+    # 2. 修复JSON字符串值内部的转义引号
+    #    AI经常在字符串值中使用 \" 来表示引号,这会破坏JSON结构
+    #    简单策略: 直接替换所有 \" 为单引号
+    json_str = json_str.translate(_CONTROL_CHARS_TABLE).replace('\\"', "'")
+
+    # 3. 移除数组或对象最后一个元素后的多余逗号
+    return _TRAIL_COMMA_RE.sub(r'\1', json_str)
+
+
+class _LLMResponseCache:
+    """LLM响应缓存：key为 sha256(模型|参数|prompt)，优先使用Redis，不可用时使用进程内LRU"""
+
+    def __init__(self, redis_url: str = REDIS_URL, ttl: int = LLM_CACHE_TTL_SECONDS, maxsize: int = 256):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._local: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+
+        try:
+            import redis
+            client = redis.Redis.from_url(redis_url, decode_responses=True)
+            client.ping()
+            self._redis = client
+        except Exception as e:
+            logger.info(f"LLM响应缓存使用进程内LRU（Redis不可用: {e}）")
+
+    @staticmethod
+    def _key(model: str, prompt: str, variant: str) -> str:
+        return "llm:" + hashlib.sha256(f"{model}|{variant}|{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, model: str, prompt: str, variant: str = "") -> Optional[str]:
+        key = self._key(model, prompt, variant)
+        if self._redis is not None:
+            try:
+                return self._redis.get(key)
+            except Exception as e:
+                logger.warning(f"读取LLM响应缓存失败: {e}")
+                return None
+
+        with self._lock:
+            value = self._local.get(key)
+            if value is not None:
+                self._local.move_to_end(key)
+            return value
+
+    def set(self, model: str, prompt: str, text: str, variant: str = ""):
+        key = self._key(model, prompt, variant)
+        if self._redis is not None:
+            try:
+                self._redis.setex(key, self.ttl, text)
+            except Exception as e:
+                logger.warning(f"写入LLM响应缓存失败: {e}")
+            return
+
+        with self._lock:
+            self._local[key] = text
+            self._local.move_to_end(key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+
+_llm_cache: Optional[_LLMResponseCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def _get_llm_cache() -> Optional[_LLMResponseCache]:
+    """获取全局LLM响应缓存（未开启LLM_CACHE时返回None）"""
+    global _llm_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                _llm_cache = _LLMResponseCache()
+    return _llm_cache
+
+
+def _with_response_cache(generate: Callable[..., str]) -> Callable[..., str]:
+    """为 generate 方法加上响应缓存（命中时跳过API调用）"""
+
+    @functools.wraps(generate)
+    def wrapper(self, prompt: str, *args, **kwargs) -> str:
+        cache = _get_llm_cache()
+        if cache is None:
+            return generate(self, prompt, *args, **kwargs)
+
+        # temperature不同时输出分布不同、输出schema不同时结果格式不同，不能共用缓存
+        variant = f"t={kwargs.get('temperature')}"
+        if kwargs.get('output_schema') is not None:
+            schema_text = json.dumps(kwargs['output_schema'], sort_keys=True)
+            variant += f"|schema={hashlib.sha1(schema_text.encode('utf-8')).hexdigest()[:12]}"
+        cached = cache.get(self.model, prompt, variant)
+        if cached is not None:
+            logger.info(f"命中LLM响应缓存 (model={self.model})")
+            return cached
+
+        text = generate(self, prompt, *args, **kwargs)
+        cache.set(self.model, prompt, text, variant)
+        return text
+
+    return wrapper
+
+
+def _dump_debug_response(response_text: str, json_text: str):
+    """保存解析失败的AI原始响应（带时间戳的文件 + 指向最新一份的固定文件名），并清理过期文件"""
+    debug_dir = os.getcwd()
+    debug_file = os.path.join(debug_dir, f"debug_ai_response_{int(time.time())}.txt")
+    with open(debug_file, "w", encoding="utf-8") as f:
+        f.write("=== 原始AI响应 ===\n")
+        f.write(response_text)
+        f.write("\n\n=== 提取的JSON ===\n")
+        f.write(json_text)
+    logger.error(f"原始响应已保存到: {debug_file}")
+
+    # 也保存一份到固定文件名（向后兼容）：优先硬链接，避免重复写入
+    debug_file_fixed = os.path.join(debug_dir, "debug_ai_response.txt")
+    try:
+        if os.path.lexists(debug_file_fixed):
+            os.remove(debug_file_fixed)
+        os.link(debug_file, debug_file_fixed)
+    except OSError:
+        shutil.copyfile(debug_file, debug_file_fixed)
+
+    # 清理超过保留期限的调试文件
+    expire_before = time.time() - FILE_RETENTION_DAYS * 86400
+    with os.scandir(debug_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith("debug_ai_response_") and entry.name.endswith(".txt"):
+                try:
+                    if entry.stat().st_mtime < expire_before:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+
 
 class AIServiceBase(ABC):
     """AI服务基类"""
 
+    # generate 是否支持 cache_prefix 参数（显式标记可缓存的静态prompt前缀）
+    supports_prompt_cache = False
+
+    # generate_json 是否支持 output_schema 参数（按JSON Schema约束输出结构）
+    supports_output_schema = False
+
+    # 是否实现 generate_json_batch（异步批量接口，价格更低但结果可能数分钟至数小时后才返回）
+    supports_message_batches = False
+
     @abstractmethod
     def generate(self, prompt: str, **kwargs) -> str:
         """生成文本"""
@@ -37,68 +272,20 @@ class AIServiceBase(ABC):
         return f"[此AI服务不支持图片分析]"
 
 
-class OpenAIService(AIServiceBase):
-    """OpenAI服务"""
-
-    def __init__(self, api_key: str, model: str = "gpt-4o", base_url: Optional[str] = None):
-        try:
-            from openai import OpenAI
-        except ImportError:
-            raise ImportError("请安装 openai: pip install openai")
-
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
-        self.model = model
-
-    def generate(self, prompt: str, temperature: float = 0.3, max_tokens: int = 8000, max_retries: int = 3, timeout: float = 180.0) -> str:
-        """
-        生成文本（带重试机制）
-
-        Args:
-            prompt: 提示词
-            temperature: 温度参数（0-1），越低越确定
-            max_tokens: 最大token数
-            max_retries: 最大重试次数
-            timeout: API 调用超时时间（秒），默认 180 秒
-
-        Returns:
-            生成的文本
-        """
-        import time
-
-        for attempt in range(max_retries):
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": "你是一位资深软件测试工程师。"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                    timeout=timeout  # 添加超时设置
-                )
-                return response.choices[0].message.content
-            except Exception as e:
-                error_msg = str(e)
-                # 检查是否是网络错误或502错误
-                if ("502" in error_msg or "timeout" in error_msg.lower()) and attempt < max_retries - 1:
-                    wait_time = (attempt + 1) * 2  # 递增等待时间
-                    logger.warning(f"OpenAI API调用失败，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    logger.error(f"OpenAI API调用失败: {e}")
-                    raise
+class _JSONResponseMixin:
+    """JSON输出解析（OpenAI/Claude 共用）"""
 
     def generate_json(self, prompt: str, **kwargs) -> Dict:
         """生成JSON格式输出"""
-        response_text = self.generate(prompt, **kwargs)
+        return self._parse_json_response(self.generate(prompt, **kwargs))
 
+    def _parse_json_response(self, response_text: str) -> Dict:
+        """从模型输出中解析JSON"""
         # 提取JSON部分
         json_text = self._extract_json(response_text)
 
         try:
-            return json.loads(json_text)
+            return _json_loads(json_text)
         except json.JSONDecodeError as e:
             logger.error(f"JSON解析失败: {e}")
             logger.error(f"错误位置: line {e.lineno}, column {e.colno}")
@@ -106,94 +293,102 @@ class OpenAIService(AIServiceBase):
             logger.error(f"提取的JSON (后500字符): {json_text[-500:]}")
 
             # 保存原始响应到文件用于调试
-            import os
-            import time
-            timestamp = int(time.time())
-            debug_file = os.path.join(os.getcwd(), f"debug_ai_response_{timestamp}.txt")
-            with open(debug_file, "w", encoding="utf-8") as f:
-                f.write("=== 原始AI响应 ===\n")
-                f.write(response_text)
-                f.write("\n\n=== 提取的JSON ===\n")
-                f.write(json_text)
-            logger.error(f"原始响应已保存到: {debug_file}")
-
-            # 也保存一份到固定文件名（向后兼容）
-            debug_file_fixed = os.path.join(os.getcwd(), "debug_ai_response.txt")
-            with open(debug_file_fixed, "w", encoding="utf-8") as f:
-                f.write("=== 原始AI响应 ===\n")
-                f.write(response_text)
-                f.write("\n\n=== 提取的JSON ===\n")
-                f.write(json_text)
+            if DEBUG_AI_DUMP:
+                _dump_debug_response(response_text, json_text)
 
             raise ValueError(f"AI返回的JSON格式有误: {e}")
 
     def _extract_json(self, text: str) -> str:
         """从文本中提取JSON部分并清理常见错误"""
-        # 移除markdown代码块标记
         text = text.strip()
 
-        # 移除开头的 "```json" 标记
-        if text.startswith("```json"):
-            text = text[7:].strip()
-        elif text.startswith("```"):
-            text = text[3:].strip()
-
-        # 移除结尾的 "```" 标记
-        if text.endswith("```"):
-            text = text[:-3].strip()
-
-        # 如果仍然有代码块标记，尝试提取
-        if "```json" in text:
-            start = text.find("```json") + 7
-            end = text.find("```", start)
-            if end != -1:
-                text = text[start:end].strip()
-        elif "```" in text:
-            start = text.find("```") + 3
-            end = text.find("```", start)
-            if end != -1:
-                text = text[start:end].strip()
-
-        # 最后尝试提取 JSON 对象
-        if not text.startswith("{"):
+        # 常见情况：直接返回了JSON对象
+        if text.startswith("{") and text.endswith("}"):
+            return _cleanup_json(text)
+
+        # 提取markdown代码块中的JSON，否则截取第一个 { 到最后一个 } 之间的内容
+        match = _JSON_FENCE_RE.search(text)
+        if match:
+            text = match.group(1)
+        else:
             start = text.find("{")
-            if start != -1:
-                end = text.rfind("}") + 1
-                if end > start:
-                    text = text[start:end]
+            end = text.rfind("}") + 1
+            if start != -1 and end > start:
+                text = text[start:end]
 
         # 清理JSON格式错误
-        text = self._cleanup_json(text)
-        return text
-
-    def _cleanup_json(self, json_str: str) -> str:
-        """清理JSON字符串中的常见错误"""
-        import re
+        return _cleanup_json(text)
 
-        # 1. 移除数组或对象最后一个元素后的多余逗号
-        json_str = re.sub(r',(\s*[\]}])', r'\1', json_str)
 
-        # 2. 修复中文引号为英文引号
-        json_str = json_str.replace('"', '"').replace('"', '"')
-        json_str = json_str.replace(''', "'").replace(''', "'")
+class OpenAIService(_JSONResponseMixin, AIServiceBase):
+    """OpenAI服务"""
 
-        # 3. 修复JSON字符串值内部的转义引号
-        # AI经常在字符串值中使用 \" 来表示引号,这会破坏JSON结构
-        # 简单策略: 直接替换所有 \" 为单引号
-        json_str = json_str.replace('\\"', "'")
+    def __init__(self, api_key: str, model: str = "gpt-4o", base_url: Optional[str] = None):
+        try:
+            import openai
+            from openai import OpenAI, RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
+        except ImportError:
+            raise ImportError("请安装 openai: pip install openai")
 
-        # 4. 移除多余的控制字符
-        json_str = re.sub(r'[\x00-\x08\x0b-\x0c\x0e-\x1f]', '', json_str)
+        self.client = OpenAI(api_key=api_key, base_url=base_url, http_client=_build_http_client(openai))
+        self.model = model
+        self._retryable = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
 
-        return json_str
+    @_with_response_cache
+    def generate(self, prompt: str, temperature: float = 0.3, max_tokens: int = 8000, max_retries: int = 5, timeout: float = 180.0) -> str:
+        """
+        生成文本（带指数退避重试机制）
 
+        Args:
+            prompt: 提示词
+            temperature: 温度参数（0-1），越低越确定
+            max_tokens: 最大token数
+            max_retries: 最大重试次数
+            timeout: API 调用超时时间（秒），默认 180 秒
 
-class ClaudeService(AIServiceBase):
+        Returns:
+            生成的文本
+        """
+        return _retry_with_backoff(
+            lambda: self._stream_completion(prompt, temperature, max_tokens, timeout),
+            retryable=self._retryable,
+            max_retries=max_retries,
+            service_name="OpenAI"
+        )
+
+    def _stream_completion(self, prompt: str, temperature: float, max_tokens: int, timeout: float) -> str:
+        """以流式方式调用API并拼接输出（持续有数据返回，避免代理层100秒空闲超时导致502/524）"""
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "你是一位资深软件测试工程师。"},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout,  # 添加超时设置
+            stream=True
+        )
+        parts = []
+        for chunk in stream:
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+        return "".join(parts)
+
+
+class ClaudeService(_JSONResponseMixin, AIServiceBase):
     """Claude服务"""
 
+    supports_prompt_cache = True
+    supports_output_schema = True
+    supports_message_batches = True
+
     def __init__(self, api_key: str, model: str = "claude-3-5-sonnet-20241022", base_url: Optional[str] = None):
         try:
-            from anthropic import Anthropic
+            import anthropic
+            from anthropic import Anthropic, RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
         except ImportError:
             raise ImportError("请安装 anthropic: pip install anthropic")
 
@@ -205,139 +400,188 @@ class ClaudeService(AIServiceBase):
             kwargs['base_url'] = base_url
 
         # 如果使用自定义认证token（而非API key）
-        import os
         auth_token = os.getenv("ANTHROPIC_AUTH_TOKEN")
         if auth_token and not api_key:
             kwargs['api_key'] = auth_token  # Anthropic客户端使用api_key参数
 
-        self.client = Anthropic(**kwargs)
+        self.client = Anthropic(http_client=_build_http_client(anthropic), **kwargs)
         self.model = model
 
-    def generate(self, prompt: str, temperature: float = 0.3, max_tokens: int = 8000, max_retries: int = 3) -> str:
-        """生成文本（带重试机制）"""
-        import time
-
-        for attempt in range(max_retries):
-            try:
-                response = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=max_tokens,
-                    temperature=temperature,
-                    messages=[
-                        {"role": "user", "content": prompt}
-                    ]
-                )
-                # 检查是否因为token限制被截断
-                if hasattr(response, 'stop_reason') and response.stop_reason == 'max_tokens':
-                    logger.warning(f"Claude响应因达到max_tokens({max_tokens})而被截断，建议增加max_tokens或简化prompt")
-                return response.content[0].text
-            except Exception as e:
-                error_msg = str(e)
-                # 检查是否是502错误（代理服务器问题）
-                if "502" in error_msg and attempt < max_retries - 1:
-                    wait_time = (attempt + 1) * 2  # 递增等待时间: 2s, 4s, 6s
-                    logger.warning(f"Claude API调用失败(502错误)，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    logger.error(f"Claude API调用失败: {e}")
-                    raise
-
-    def generate_json(self, prompt: str, **kwargs) -> Dict:
-        """生成JSON格式输出"""
-        response_text = self.generate(prompt, **kwargs)
-
-        # 提取JSON部分
-        json_text = self._extract_json(response_text)
-
-        try:
-            return json.loads(json_text)
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON解析失败: {e}")
-            logger.error(f"错误位置: line {e.lineno}, column {e.colno}")
-            logger.error(f"提取的JSON (前500字符): {json_text[:500]}")
-            logger.error(f"提取的JSON (后500字符): {json_text[-500:]}")
-
-            # 保存原始响应到文件用于调试
-            import os
-            import time
-            timestamp = int(time.time())
-            debug_file = os.path.join(os.getcwd(), f"debug_ai_response_{timestamp}.txt")
-            with open(debug_file, "w", encoding="utf-8") as f:
-                f.write("=== 原始AI响应 ===\n")
-                f.write(response_text)
-                f.write("\n\n=== 提取的JSON ===\n")
-                f.write(json_text)
-            logger.error(f"原始响应已保存到: {debug_file}")
-
-            # 也保存一份到固定文件名（向后兼容）
-            debug_file_fixed = os.path.join(os.getcwd(), "debug_ai_response.txt")
-            with open(debug_file_fixed, "w", encoding="utf-8") as f:
-                f.write("=== 原始AI响应 ===\n")
-                f.write(response_text)
-                f.write("\n\n=== 提取的JSON ===\n")
-                f.write(json_text)
-
-            raise ValueError(f"AI返回的JSON格式有误: {e}")
+        # 模块测试用例默认通过强制工具调用输出（supports_output_schema），旧版SDK的messages.stream不接受tools/tool_choice，
+        # 每次调用都会TypeError且被当作该模块生成失败，最终得到空的测试用例
+        if "tool_choice" not in inspect.signature(self.client.messages.stream).parameters:
+            raise ImportError(
+                f"anthropic SDK 版本过旧（当前 {anthropic.__version__}），不支持强制工具调用，"
+                "请执行: pip install -r requirements.txt"
+            )
 
-    def _extract_json(self, text: str) -> str:
-        """从文本中提取JSON部分并清理常见错误"""
-        text = text.strip()
+        # 开启批处理时SDK必须支持Message Batches，否则每次生成都会在提交批次时失败再回退到逐个调用
+        if MESSAGE_BATCH_ENABLED and not hasattr(self.client.messages, "batches"):
+            raise ImportError(
+                f"MESSAGE_BATCH=1 需要支持 Message Batches 的 anthropic SDK（当前 {anthropic.__version__}），"
+                "请执行: pip install -r requirements.txt"
+            )
+        self._retryable = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
 
-        # 移除开头的 "```json" 标记
-        if text.startswith("```json"):
-            text = text[7:].strip()
-        elif text.startswith("```"):
-            text = text[3:].strip()
-
-        # 移除结尾的 "```" 标记
-        if text.endswith("```"):
-            text = text[:-3].strip()
-
-        # 如果仍然有代码块标记，尝试提取
-        if "```json" in text:
-            start = text.find("```json") + 7
-            end = text.find("```", start)
-            if end != -1:
-                text = text[start:end].strip()
-        elif "```" in text:
-            start = text.find("```") + 3
-            end = text.find("```", start)
-            if end != -1:
-                text = text[start:end].strip()
-
-        # 最后尝试提取 JSON 对象
-        if not text.startswith("{"):
-            start = text.find("{")
-            if start != -1:
-                end = text.rfind("}") + 1
-                if end > start:
-                    text = text[start:end]
+    @_with_response_cache
+    def generate(self, prompt: str, temperature: float = 0.3, max_tokens: int = 8000, max_retries: int = 5,
+                 cache_prefix: str = "") -> str:
+        """
+        生成文本（带指数退避重试机制）
 
-        # 清理JSON格式错误
-        text = self._cleanup_json(text)
+        Args:
+            cache_prefix: prompt开头的静态部分，作为单独的内容块开启Anthropic提示缓存
+                （相同前缀的后续请求按缓存价格计费并减少预填充耗时；不足模型最小长度时API不缓存）
+        """
+        text, response = _retry_with_backoff(
+            lambda: self._stream_message(prompt, temperature, max_tokens, cache_prefix),
+            retryable=self._retryable,
+            max_retries=max_retries,
+            service_name="Claude"
+        )
+        self._log_cache_usage(response)
+
+        # 检查是否因为token限制被截断
+        if response.stop_reason == 'max_tokens':
+            logger.warning(f"Claude响应因达到max_tokens({max_tokens})而被截断，建议增加max_tokens或简化prompt")
         return text
 
-    def _cleanup_json(self, json_str: str) -> str:
-        """清理JSON字符串中的常见错误"""
-        import re
+    def generate_json(self, prompt: str, output_schema: Optional[Dict] = None, **kwargs) -> Dict:
+        """
+        生成JSON格式输出
 
-        # 1. 移除数组或对象最后一个元素后的多余逗号
-        json_str = re.sub(r',(\s*[\]}])', r'\1', json_str)
+        Args:
+            output_schema: 输出的JSON Schema；指定时强制模型调用以该schema为参数的工具，
+                直接得到结构化结果（不再从文本中提取和清理JSON）
+        """
+        if output_schema is None:
+            return super().generate_json(prompt, **kwargs)
+        return _json_loads(self._generate_tool_input(prompt, output_schema=output_schema, **kwargs))
+
+    @_with_response_cache
+    def _generate_tool_input(self, prompt: str, temperature: float = 0.3, max_tokens: int = 8000, max_retries: int = 5,
+                             cache_prefix: str = "", output_schema: Optional[Dict] = None) -> str:
+        """强制调用输出工具，返回工具参数的JSON文本（文本形式便于响应缓存）"""
+        response = _retry_with_backoff(
+            lambda: self._stream_tool_call(prompt, temperature, max_tokens, cache_prefix, output_schema),
+            retryable=self._retryable,
+            max_retries=max_retries,
+            service_name="Claude"
+        )
+        self._log_cache_usage(response)
+
+        # 被截断时工具参数不完整
+        if response.stop_reason == 'max_tokens':
+            raise ValueError(f"Claude响应因达到max_tokens({max_tokens})而被截断，输出结构不完整")
+        for block in response.content:
+            if block.type == "tool_use":
+                return json.dumps(block.input, ensure_ascii=False)
+        raise ValueError("Claude未返回结构化输出")
+
+    def _stream_tool_call(self, prompt: str, temperature: float, max_tokens: int, cache_prefix: str,
+                          output_schema: Dict) -> Any:
+        """以流式方式调用API并强制使用输出工具，返回完整消息"""
+        with self.client.messages.stream(
+            model=self.model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            tools=[{
+                "name": _OUTPUT_TOOL_NAME,
+                "description": "按要求的JSON结构输出结果",
+                "input_schema": output_schema,
+            }],
+            tool_choice={"type": "tool", "name": _OUTPUT_TOOL_NAME},
+            messages=[
+                {"role": "user", "content": self._message_content(prompt, cache_prefix)}
+            ]
+        ) as stream:
+            return stream.get_final_message()
+
+    @staticmethod
+    def _log_cache_usage(response):
+        usage = getattr(response, 'usage', None)
+        cache_read = getattr(usage, 'cache_read_input_tokens', None)
+        if cache_read:
+            logger.info(f"Claude提示缓存命中 {cache_read} tokens")
+
+    def _stream_message(self, prompt: str, temperature: float, max_tokens: int,
+                        cache_prefix: str = "") -> Tuple[str, Any]:
+        """以流式方式调用API并拼接输出（持续有数据返回，避免代理层100秒空闲超时导致502/524）"""
+        with self.client.messages.stream(
+            model=self.model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            messages=[
+                {"role": "user", "content": self._message_content(prompt, cache_prefix)}
+            ]
+        ) as stream:
+            parts = list(stream.text_stream)
+            final_message = stream.get_final_message()
+        return "".join(parts), final_message
 
-        # 2. 修复中文引号为英文引号
-        json_str = json_str.replace('"', '"').replace('"', '"')
-        json_str = json_str.replace(''', "'").replace(''', "'")
+    @staticmethod
+    def _message_content(prompt: str, cache_prefix: str = ""):
+        """构建用户消息内容，静态前缀单独作为开启提示缓存的内容块"""
+        if cache_prefix and prompt.startswith(cache_prefix) and len(prompt) > len(cache_prefix):
+            return [
+                {"type": "text", "text": cache_prefix, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": prompt[len(cache_prefix):]},
+            ]
+        return prompt
+
+    def generate_json_batch(self, prompts: Dict[str, str], temperature: float = 0.3, max_tokens: int = 8000,
+                            cache_prefix: str = "", poll_interval: float = MESSAGE_BATCH_POLL_SECONDS,
+                            timeout: float = MESSAGE_BATCH_TIMEOUT_SECONDS) -> Dict[str, Dict]:
+        """
+        通过Message Batches API批量生成JSON（按标准价格的50%计费），阻塞轮询直到批次处理结束
 
-        # 3. 修复JSON字符串值内部的转义引号
-        # AI经常在字符串值中使用 \" 来表示引号,这会破坏JSON结构
-        # 简单策略: 直接替换所有 \" 为单引号
-        json_str = json_str.replace('\\"', "'")
+        Args:
+            prompts: {custom_id: prompt}，custom_id 只能包含字母、数字、- 和 _（1-64个字符）
+            poll_interval: 轮询间隔（秒）
+            timeout: 最长等待时间（秒），超时后取消批次并抛出 TimeoutError
 
-        # 4. 移除多余的控制字符
-        json_str = re.sub(r'[\x00-\x08\x0b-\x0c\x0e-\x1f]', '', json_str)
+        Returns:
+            {custom_id: JSON结果}，失败、过期或JSON解析失败的请求不包含在内
+        """
+        batches = self.client.messages.batches
+        batch = batches.create(requests=[
+            {
+                "custom_id": custom_id,
+                "params": {
+                    "model": self.model,
+                    "max_tokens": max_tokens,
+                    "temperature": temperature,
+                    "messages": [{"role": "user", "content": self._message_content(prompt, cache_prefix)}],
+                },
+            }
+            for custom_id, prompt in prompts.items()
+        ])
+        logger.info(f"已提交Claude消息批次 {batch.id}（{len(prompts)} 个请求）")
+
+        deadline = time.monotonic() + timeout
+        while batch.processing_status != "ended":
+            if time.monotonic() > deadline:
+                batches.cancel(batch.id)
+                raise TimeoutError(f"Claude消息批次 {batch.id} 超过 {timeout:.0f} 秒未完成，已取消")
+            time.sleep(poll_interval)
+            batch = batches.retrieve(batch.id)
+
+        results = {}
+        for entry in batches.results(batch.id):
+            if entry.result.type != "succeeded":
+                logger.warning(f"批次请求 {entry.custom_id} 未成功: {entry.result.type}")
+                continue
+
+            message = entry.result.message
+            if message.stop_reason == 'max_tokens':
+                logger.warning(f"批次请求 {entry.custom_id} 因达到max_tokens({max_tokens})而被截断")
+            text = "".join(block.text for block in message.content if block.type == "text")
+            try:
+                results[entry.custom_id] = self._parse_json_response(text)
+            except ValueError as e:
+                logger.warning(f"批次请求 {entry.custom_id} {e}")
 
-        return json_str
+        return results
 
     def analyze_image(self, image_data: str, prompt: str, media_type: str = "image/jpeg", **kwargs) -> str:
         """
@@ -351,6 +595,15 @@ class ClaudeService(AIServiceBase):
         Returns:
             AI对图片的描述
         """
+        # 同一张图片（按内容哈希）+ 同一提示词的分析结果可直接复用
+        cache = _get_llm_cache()
+        variant = "image:" + hashlib.sha256(image_data.encode("ascii")).hexdigest() if cache is not None else ""
+        if cache is not None:
+            cached = cache.get(self.model, prompt, variant)
+            if cached is not None:
+                logger.info(f"命中图片分析缓存 (model={self.model})")
+                return cached
+
         try:
             response = self.client.messages.create(
                 model=self.model,
@@ -376,11 +629,15 @@ class ClaudeService(AIServiceBase):
                     }
                 ],
             )
-            return response.content[0].text
+            description = response.content[0].text
         except Exception as e:
             logger.error(f"Claude图片分析失败: {e}")
             return f"[图片分析失败: {str(e)}]"
 
+        if cache is not None:
+            cache.set(self.model, prompt, description, variant)
+        return description
+
 
 class AIServiceFactory:
     """AI服务工厂"""
@@ -390,6 +647,8 @@ class AIServiceFactory:
         """
         创建AI服务实例
 
+        相同 model_type 和配置参数返回同一个实例，复用底层HTTP连接池（避免每次请求重新建立TCP/TLS连接）
+
         Args:
             model_type: 模型类型（openai/claude/wenxin/qianwen）
             **config: 配置参数
@@ -397,6 +656,14 @@ class AIServiceFactory:
         Returns:
             AI服务实例
         """
+        return AIServiceFactory._create_shared(model_type, tuple(sorted(config.items())))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=8)
+    def _create_shared(model_type: str, config_items: Tuple[Tuple[str, Any], ...]) -> AIServiceBase:
+        """按 (model_type, 配置参数) 缓存服务实例"""
+        config = dict(config_items)
+
         if model_type == "openai":
             try:
                 from .config import OPENAI_API_KEY, OPENAI_MODEL, OPENAI_BASE_URL
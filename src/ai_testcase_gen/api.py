@@ -8,12 +8,21 @@ from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
 import uuid
+import aiofiles
 
 from .generator import TestCaseGenerator
-from .config import UPLOAD_DIR, OUTPUT_DIR, DEFAULT_AI_MODEL
+from .task_store import TaskStore, create_task_store
+from .config import (
+    UPLOAD_DIR, OUTPUT_DIR, DEFAULT_AI_MODEL, MAX_DOCUMENT_SIZE_MB,
+    REDIS_URL, GENERATE_QUEUE_ENABLED, GENERATE_QUEUE_NAME, GENERATE_JOB_TIMEOUT
+)
 
 logger = logging.getLogger(__name__)
 
+# 上传文件分块大小（1MB）
+UPLOAD_CHUNK_SIZE = 1 << 20
+MAX_UPLOAD_BYTES = MAX_DOCUMENT_SIZE_MB * 1024 * 1024
+
 # 创建FastAPI应用
 app = FastAPI(
     title="TestForge AI测试用例生成服务",
@@ -24,8 +33,42 @@ app = FastAPI(
 # 全局生成器实例
 generator = TestCaseGenerator(ai_model=DEFAULT_AI_MODEL)
 
-# 任务状态存储（简单版本，生产环境应使用Redis）
-task_status = {}
+# 任务状态存储（Redis，多worker共享；不可用时降级为进程内存储）
+task_store = create_task_store()
+
+
+def _create_generate_queue():
+    """
+    创建RQ生成任务队列
+
+    开启GENERATE_QUEUE、任务状态使用Redis且已安装rq时，生成任务交给独立的 `rq worker generate` 进程执行；
+    否则返回None，退回到进程内的BackgroundTasks
+    """
+    if not GENERATE_QUEUE_ENABLED:
+        return None
+
+    if not isinstance(task_store, TaskStore):
+        logger.warning("GENERATE_QUEUE=1 但Redis不可用，生成任务将在API进程内执行")
+        return None
+
+    try:
+        import redis
+        from rq import Queue
+    except ImportError:
+        logger.warning("未安装rq，生成任务将在API进程内执行（pip install rq）")
+        return None
+
+    # RQ需要存取pickle数据，不能复用decode_responses=True的连接
+    queue = Queue(
+        GENERATE_QUEUE_NAME,
+        connection=redis.Redis.from_url(REDIS_URL),
+        default_timeout=GENERATE_JOB_TIMEOUT
+    )
+    logger.info(f"生成任务投递到RQ队列 {GENERATE_QUEUE_NAME}（需运行 rq worker {GENERATE_QUEUE_NAME}）")
+    return queue
+
+
+generate_queue = _create_generate_queue()
 
 
 # ========================
@@ -48,6 +91,7 @@ class TaskStatusResponse(BaseModel):
     progress: int  # 0-100
     message: str
     result: Optional[dict] = None
+    queue_length: Optional[int] = None  # 排队中（pending）时RQ队列里等待执行的任务数；未使用队列时为None
 
 
 class GenerateResponse(BaseModel):
@@ -86,10 +130,24 @@ async def upload_document(file: UploadFile = File(...)):
         saved_filename = f"{file_id}{file_ext}"
         file_path = os.path.join(UPLOAD_DIR, saved_filename)
 
-        # 保存文件
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # 分块保存文件，避免整个文件读入内存
+        size = 0
+        async with aiofiles.open(file_path, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    break
+                await f.write(chunk)
+
+        if size > MAX_UPLOAD_BYTES:
+            os.remove(file_path)
+            raise HTTPException(
+                status_code=413,
+                detail=f"文件过大，最大支持 {MAX_DOCUMENT_SIZE_MB}MB"
+            )
 
         logger.info(f"文件上传成功：{file_path}")
 
@@ -98,22 +156,26 @@ async def upload_document(file: UploadFile = File(...)):
             "file_id": file_id,
             "file_path": file_path,
             "original_filename": file.filename,
-            "file_size": len(content)
+            "file_size": size
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"文件上传失败：{e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/generate", response_model=GenerateResponse)
-async def generate_test_cases(
+def generate_test_cases(
     request: GenerateRequest,
     background_tasks: BackgroundTasks
 ):
     """
     生成测试用例（异步）
 
+    普通def端点：任务状态存储和RQ队列都是同步Redis调用，FastAPI在线程池中执行，不阻塞事件循环
+
     Args:
         request: 生成请求参数
         background_tasks: 后台任务
@@ -130,21 +192,25 @@ async def generate_test_cases(
         task_id = str(uuid.uuid4())
 
         # 初始化任务状态
-        task_status[task_id] = {
-            "task_id": task_id,
-            "status": "pending",
-            "progress": 0,
-            "message": "任务已创建，等待处理",
-            "result": None
-        }
-
-        # 添加后台任务
-        background_tasks.add_task(
-            _generate_task,
+        task_store.update(
             task_id,
-            request
+            task_id=task_id,
+            status="pending",
+            progress=0,
+            message="任务已创建，等待处理",
+            result=None
         )
 
+        # 提交任务：优先投递到RQ队列，否则作为后台任务在本进程执行
+        if generate_queue is not None:
+            generate_queue.enqueue(_generate_task, task_id, request.model_dump(), job_id=task_id)
+        else:
+            background_tasks.add_task(
+                _generate_task,
+                task_id,
+                request.model_dump()
+            )
+
         logger.info(f"创建生成任务：{task_id}")
 
         return GenerateResponse(
@@ -159,7 +225,7 @@ async def generate_test_cases(
 
 
 @app.get("/api/status/{task_id}", response_model=TaskStatusResponse)
-async def get_task_status(task_id: str):
+def get_task_status(task_id: str):
     """
     查询任务状态
 
@@ -169,10 +235,14 @@ async def get_task_status(task_id: str):
     Returns:
         任务状态和结果
     """
-    if task_id not in task_status:
+    task = task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="任务不存在")
 
-    return TaskStatusResponse(**task_status[task_id])
+    if generate_queue is not None and task.get("status") == "pending":
+        task["queue_length"] = generate_queue.count
+
+    return TaskStatusResponse(**task)
 
 
 @app.get("/api/download/{filename}")
@@ -212,74 +282,79 @@ async def health_check():
 # 后台任务
 # ========================
 
-def _generate_task(task_id: str, request: GenerateRequest):
+def _generate_task(task_id: str, request: dict):
     """
-    后台生成任务
+    后台生成任务（RQ worker 或 BackgroundTasks 中执行）
 
     Args:
         task_id: 任务ID
-        request: 生成请求
+        request: 生成请求（GenerateRequest.model_dump() 的结果，便于序列化投递）
     """
     try:
         # 更新状态：处理中
-        task_status[task_id].update({
-            "status": "processing",
-            "progress": 10,
-            "message": "正在解析文档..."
-        })
-
-        # 创建生成器（如果指定了AI模型）
-        if request.ai_model:
-            gen = TestCaseGenerator(ai_model=request.ai_model)
+        task_store.update(
+            task_id,
+            status="processing",
+            progress=10,
+            message="正在解析文档..."
+        )
+
+        # 创建生成器（如果指定了不同的AI模型）
+        if request['ai_model'] and request['ai_model'] != DEFAULT_AI_MODEL:
+            gen = TestCaseGenerator(ai_model=request['ai_model'])
         else:
             gen = generator
 
         # 更新状态：AI提取
-        task_status[task_id].update({
-            "progress": 30,
-            "message": "正在使用AI提取测试点..."
-        })
+        task_store.update(
+            task_id,
+            progress=30,
+            message="正在使用AI提取测试点..."
+        )
 
         # 生成测试用例
         result = gen.generate(
-            document_path=request.document_path,
-            output_filename=request.output_filename,
-            enable_defect_detection=request.enable_defect_detection,
-            enable_question_generation=request.enable_question_generation
+            document_path=request['document_path'],
+            output_filename=request['output_filename'],
+            enable_defect_detection=request['enable_defect_detection'],
+            enable_question_generation=request['enable_question_generation']
         )
 
         if result['success']:
             # 更新状态：完成
-            task_status[task_id].update({
-                "status": "completed",
-                "progress": 100,
-                "message": "生成完成",
-                "result": {
+            task_store.update(
+                task_id,
+                status="completed",
+                progress=100,
+                message="生成完成",
+                result={
                     "xmind_path": result['xmind_path'],
                     "xmind_filename": os.path.basename(result['xmind_path']),
                     "statistics": result['statistics'],
                     "document_title": result.get('document_title', '')
                 }
-            })
+            )
             logger.info(f"任务完成：{task_id}")
         else:
             # 更新状态：失败
-            task_status[task_id].update({
-                "status": "failed",
-                "progress": 0,
-                "message": f"生成失败：{result.get('error', '未知错误')}",
-                "result": None
-            })
+            task_store.update(
+                task_id,
+                status="failed",
+                progress=0,
+                message=f"生成失败：{result.get('error', '未知错误')}",
+                result=None
+            )
             logger.error(f"任务失败：{task_id}, 错误：{result.get('error')}")
 
     except Exception as e:
         # 更新状态：异常
-        task_status[task_id].update({
-            "status": "failed",
-            "progress": 0,
-            "message": f"处理异常：{str(e)}",
-            "result": None
-        })
+        task_store.update(
+            task_id,
+            status="failed",
+            progress=0,
+            message=f"处理异常：{str(e)}",
+            result=None
+        )
         logger.error(f"任务异常：{task_id}, 错误：{e}", exc_info=True)
 
 
@@ -99,6 +99,23 @@ SUPPORTED_FORMATS = [".docx", ".pdf"]
 # 文档解析最大大小（MB）
 MAX_DOCUMENT_SIZE_MB = 50
 
+# ========================
+# 用例生成配置
+# ========================
+
+# 每次AI请求合并生成的模块数（1 表示逐模块请求）
+MODULE_BATCH_SIZE = int(os.getenv("MODULE_BATCH_SIZE", "4"))
+
+# AI请求并发数：从初始值开始按实测吞吐量自动调整，不超过上限
+AI_CONCURRENCY_INITIAL = int(os.getenv("AI_CONCURRENCY_INITIAL", "2"))
+AI_CONCURRENCY_MAX = int(os.getenv("AI_CONCURRENCY_MAX", "16"))
+
+# 通过Claude Message Batches API生成模块测试用例（价格减半，但结果可能数分钟至数小时后才返回；
+# 只适合非紧急的后台任务，generate(urgent=True) 时仍逐请求并发调用）
+MESSAGE_BATCH_ENABLED = os.getenv("MESSAGE_BATCH", "0") == "1"
+MESSAGE_BATCH_POLL_SECONDS = float(os.getenv("MESSAGE_BATCH_POLL_SECONDS", "30"))
+MESSAGE_BATCH_TIMEOUT_SECONDS = float(os.getenv("MESSAGE_BATCH_TIMEOUT_SECONDS", "86400"))
+
 # ========================
 # 数据库配置
 # ========================
@@ -121,6 +138,27 @@ QDRANT_COLLECTION = "test_case_library"
 # Redis配置
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
+# 任务状态过期时间（秒），默认保留1天
+TASK_STATUS_TTL_SECONDS = int(os.getenv("TASK_STATUS_TTL_SECONDS", "86400"))
+
+# LLM响应缓存（LLM_CACHE=1 开启；按 模型+prompt 的sha256缓存，重复上传同一文档时直接返回）
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "0") == "1"
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "604800"))  # 默认7天
+
+# 文档解析结果缓存（PARSE_CACHE=1 开启；按文件内容sha1缓存解析结果和图片分析结果，保存在 outputs/.parse_cache）
+PARSE_CACHE_ENABLED = os.getenv("PARSE_CACHE", "0") == "1"
+
+# 生成结果缓存（RESULT_CACHE=1 开启；段落指纹相似度不低于阈值的文档直接复用上次的生成结果，保存在 outputs/.result_cache）
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE", "0") == "1"
+RESULT_CACHE_SIMILARITY = float(os.getenv("RESULT_CACHE_SIMILARITY", "0.95"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "500"))  # 索引最多保留的条目数（超出时淘汰最早的）
+
+# RQ任务队列（GENERATE_QUEUE=1 开启；需安装rq，任务状态使用Redis，并单独启动worker: rq worker generate，见README）
+# 未开启时生成任务在API进程内通过BackgroundTasks执行
+GENERATE_QUEUE_ENABLED = os.getenv("GENERATE_QUEUE", "0") == "1"
+GENERATE_QUEUE_NAME = os.getenv("GENERATE_QUEUE_NAME", "generate")
+GENERATE_JOB_TIMEOUT = int(os.getenv("GENERATE_JOB_TIMEOUT", "1800"))  # 单个生成任务超时（秒）
+
 # ========================
 # 文件存储配置
 # ========================
@@ -132,6 +170,9 @@ OUTPUT_DIR = os.path.join(os.getcwd(), "outputs")
 # 临时文件自动清理配置
 FILE_RETENTION_DAYS = int(os.getenv("FILE_RETENTION_DAYS", "7"))  # 默认保留7天
 
+# JSON解析失败时是否保存AI原始响应（DEBUG_AI_DUMP=1 开启）
+DEBUG_AI_DUMP = os.getenv("DEBUG_AI_DUMP", "0") == "1"
+
 # 确保目录存在
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
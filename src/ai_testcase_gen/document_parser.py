@@ -1,22 +1,179 @@
 """
 文档解析器：解析Word和PDF文档,支持提取图片
 """
+import atexit
+import functools
 import os
 import re
+import threading
 import base64
 import io
+from collections import Counter
+from itertools import islice
 from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 import logging
 
 logger = logging.getLogger(__name__)
 
+# pybase64 使用SIMD编码，大图片比标准库快数倍；未安装时回退到标准库
+try:
+    import pybase64
+    _b64encode_str = pybase64.b64encode_as_string
+except ImportError:
+    def _b64encode_str(data) -> str:
+        return base64.b64encode(data).decode('ascii')
+
+# jieba 中文分词（可选）；未安装时按连续汉字/字母切分
+try:
+    import jieba
+except ImportError:
+    jieba = None
+
+# WordprocessingML 元素的完整限定名（模块级预先拼好，遍历时直接比较）
+_W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_QN_P = _W_NS + 'p'
+_QN_DRAWING = _W_NS + 'drawing'
+_QN_R = _W_NS + 'r'
+_QN_HYPERLINK = _W_NS + 'hyperlink'
+_QN_VAL = _W_NS + 'val'
+_PSTYLE_PATH = _W_NS + 'pPr/' + _W_NS + 'pStyle'
+_QN_BLIP = '{http://schemas.openxmlformats.org/drawingml/2006/main}blip'
+_QN_EMBED = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed'
+
+# PDF标题格式合并为一个正则，每行只需扫描一次：
+#   1. 标题 / 第一章 标题 / A. 标题
+_PDF_HEADING_RE = re.compile(r'^(?:\d+\.\s+|第[一二三四五六七八九十\d]+章\s+|[A-Z][、.]\s+)(.+)$')
+_HEADING_LEVEL_RE = re.compile(r'Heading\s*(\d+)')
+
+# 关键词切分：连续汉字或连续英文字母
+_TOKEN_RE = re.compile(r'[\u4e00-\u9fff]+|[A-Za-z]+')
+# 热循环中的成员判断统一用frozenset/元组前缀，避免退化为逐项扫描列表
+_STOPWORDS = frozenset({'的', '了', '和', '是', '在', '有', '与', '等', '及', '为'})
+
+# 纯文本标题前缀（str.startswith 接受元组，一次调用完成多前缀判断）
+_HEADING_PREFIXES = ('一、', '二、', '三、', '四、', '五、', '六、', '七、', '八、', '九、', '十、',
+                     '1.', '2.', '3.', '4.', '5.',
+                     '（一）', '（二）', '（三）', '（四）', '（五）')
+
+# PDF图片格式到media_type的映射
+_MEDIA_TYPE_MAP = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'gif': 'image/gif',
+    'bmp': 'image/bmp',
+    'tiff': 'image/tiff'
+}
+
+# OLE/COM复合文档（旧.doc格式）的魔数
+_OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+# ZIP本地文件头（.docx）的魔数
+_ZIP_MAGIC = b'PK\x03\x04'
+
+
+# 解析后端按需导入：首次调用时导入并缓存，后续调用直接返回模块
+@functools.lru_cache(maxsize=None)
+def _import_docx():
+    """导入python-docx"""
+    try:
+        import docx
+        import docx.enum.style
+    except ImportError:
+        raise ImportError("请安装 python-docx: pip install python-docx")
+    return docx
+
+
+@functools.lru_cache(maxsize=None)
+def _import_fitz():
+    """导入PyMuPDF"""
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        raise ImportError("请安装 PyMuPDF: pip install PyMuPDF")
+    return fitz
+
+
+@functools.lru_cache(maxsize=None)
+def _import_win32com():
+    """导入pywin32，返回 (pythoncom, win32com.client)"""
+    try:
+        import pythoncom
+        import win32com.client
+    except ImportError:
+        raise ImportError("解析.doc文件需要安装 pywin32: pip install pywin32")
+    return pythoncom, win32com.client
+
+
+class _WordApplicationPool:
+    """
+    复用Word.Application实例（启动Word需1~3秒，批量解析.doc时不再逐个启动）
+
+    COM对象属于单线程套间（STA），不能跨线程使用，因此每个线程各持有一个实例，
+    CoInitialize也只在线程首次使用时调用一次；进程退出时统一关闭
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._apps = []
+        self._lock = threading.Lock()
+        atexit.register(self.shutdown)
+
+    def get(self):
+        """获取当前线程的Word实例，不存在时创建"""
+        app = getattr(self._local, 'app', None)
+        if app is None:
+            pythoncom, win32com_client = _import_win32com()
+
+            if not getattr(self._local, 'com_initialized', False):
+                pythoncom.CoInitialize()
+                self._local.com_initialized = True
+
+            app = win32com_client.Dispatch("Word.Application")
+            app.Visible = False
+            self._local.app = app
+            with self._lock:
+                self._apps.append(app)
+        return app
+
+    def discard(self):
+        """丢弃当前线程的Word实例（出错后状态未知，下次重新创建）"""
+        app = getattr(self._local, 'app', None)
+        if app is None:
+            return
+        self._local.app = None
+        with self._lock:
+            if app in self._apps:
+                self._apps.remove(app)
+        try:
+            app.Quit()
+        except Exception:
+            pass
+
+    def shutdown(self):
+        """关闭所有Word实例"""
+        with self._lock:
+            apps, self._apps = self._apps, []
+        for app in apps:
+            try:
+                app.Quit()
+            except Exception:
+                pass
+
+
+_word_app_pool = _WordApplicationPool()
+
 
 class DocumentParser:
     """文档解析器"""
 
-    def __init__(self):
+    def __init__(self, max_paragraphs: Optional[int] = None):
+        """
+        Args:
+            max_paragraphs: Word段落 / 纯文本行的最大处理数量，超出部分忽略（默认不限制）
+        """
         self.supported_formats = ['.docx', '.pdf', '.doc']
+        self.max_paragraphs = max_paragraphs
 
     def parse(self, file_path: str) -> Dict:
         """
@@ -46,180 +203,160 @@ class DocumentParser:
         if file_ext not in self.supported_formats:
             raise ValueError(f"不支持的文件格式：{file_ext}")
 
-        if file_ext in ['.docx', '.doc']:
+        if file_ext in ('.docx', '.doc'):
             return self._parse_word(file_path)
         elif file_ext == '.pdf':
             return self._parse_pdf(file_path)
 
     def _parse_word(self, file_path: str) -> Dict:
         """解析Word文档（支持.doc和.docx）"""
-        # 首先验证文件存在且可读
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"文件不存在: {file_path}")
+        # 一次读取文件头，同时验证文件存在、非空并判断格式
+        header = self._read_file_header(file_path)
 
-        if os.path.getsize(file_path) == 0:
+        if not header:
             raise ValueError(f"文件为空: {file_path}")
 
-        # 检查是否是旧的.doc格式
-        is_old_doc = self._is_old_doc_format(file_path)
-
-        if is_old_doc:
+        if header == _OLE_MAGIC:
             # 使用win32com处理旧.doc格式
             return self._parse_old_doc(file_path)
 
+        if not header.startswith(_ZIP_MAGIC):
+            raise ValueError(f"无法打开Word文档，文件既不是.docx也不是.doc格式: {file_path}")
+
         # 使用python-docx处理.docx格式
-        try:
-            from docx import Document
-        except ImportError:
-            raise ImportError("请安装 python-docx: pip install python-docx")
+        docx = _import_docx()
 
         try:
-            doc = Document(file_path)
+            doc = docx.Document(file_path)
         except Exception as e:
             # 增强错误信息
             logger.error(f"python-docx无法打开文件: {e}")
             raise ValueError(f"无法打开Word文档，可能文件已损坏或格式不正确: {str(e)}")
 
-        # 提取文档标题
-        title = self._extract_title_from_word(doc)
-
-        # 提取章节结构
-        sections = self._extract_sections_from_word(doc)
-
-        # 提取完整文本
-        raw_text = '\n'.join([para.text for para in doc.paragraphs if para.text.strip()])
-
-        # 提取图片
-        images = self._extract_images_from_word(doc)
-        logger.info(f"从Word文档中提取了 {len(images)} 张图片")
-
-        return {
-            'title': title,
-            'sections': sections,
-            'raw_text': raw_text,
-            'images': images,
-            'metadata': {
-                'format': 'docx',
-                'paragraph_count': len(doc.paragraphs),
-                'section_count': len(sections),
-                'image_count': len(images)
-            }
-        }
+        return self._parse_docx_directly(doc, file_path)
 
     def _parse_docx_directly(self, doc, file_path: str) -> Dict:
-        """直接解析已打开的docx文档对象"""
-        # 提取文档标题
-        title = self._extract_title_from_word(doc)
+        """
+        直接解析已打开的docx文档对象
+
+        只遍历一次<w:body>下的段落元素，同时提取标题、章节、文本和图片
+        """
+        heading_levels, default_level = self._get_heading_levels(doc)
 
-        # 提取章节结构
-        sections = self._extract_sections_from_word(doc)
+        title = None
+        sections = []
+        current_section = None
+        current_content = []
+        text_lines = []
+        para_index = {}  # 段落元素 -> 段落序号，用于定位图片
+
+        # 与doc.paragraphs一致：只取body的直接子段落（不含表格内段落）
+        paragraphs = islice(doc.element.body.iterchildren(_QN_P), self.max_paragraphs)
+        for para_idx, p_el in enumerate(paragraphs):
+            para_index[p_el] = para_idx
+            # 与CT_P.text相同（run/超链接各自负责制表符、换行的转换），但不必每段编译XPath
+            para_text = ''.join([child.text for child in p_el.iterchildren(_QN_R, _QN_HYPERLINK)])
+            text = para_text.strip()
+
+            if text:
+                text_lines.append(para_text)
+                if title is None:
+                    title = text
+
+                # 判断是否为标题（直接读取 w:pPr/w:pStyle/@w:val 样式ID）
+                pstyle = p_el.find(_PSTYLE_PATH)
+                style_id = pstyle.get(_QN_VAL) if pstyle is not None else None
+                level = heading_levels.get(style_id, default_level) if style_id else default_level
+                if level is not None:
+                    # 保存上一个章节
+                    if current_section:
+                        current_section['content'] = '\n'.join(current_content)
+                        sections.append(current_section)
+
+                    # 创建新章节
+                    current_section = {
+                        'heading': text,
+                        'level': level,
+                        'content': '',
+                        'subsections': []
+                    }
+                    current_content = []
+                elif current_section:
+                    # 普通段落，加入当前章节内容
+                    current_content.append(text)
 
-        # 提取完整文本
-        raw_text = '\n'.join([para.text for para in doc.paragraphs if para.text.strip()])
+        # 保存最后一个章节
+        if current_section:
+            current_section['content'] = '\n'.join(current_content)
+            sections.append(current_section)
 
         # 提取图片
-        images = self._extract_images_from_word(doc)
+        images = self._extract_images_from_word(doc, para_index)
         logger.info(f"从Word文档中提取了 {len(images)} 张图片")
 
         return {
-            'title': title,
+            'title': title or "未命名文档",
             'sections': sections,
-            'raw_text': raw_text,
+            'raw_text': '\n'.join(text_lines),
             'images': images,
             'metadata': {
                 'format': 'docx',
-                'paragraph_count': len(doc.paragraphs),
+                'paragraph_count': len(para_index),
                 'section_count': len(sections),
                 'image_count': len(images)
             }
         }
 
-    def _extract_title_from_word(self, doc) -> str:
-        """从Word文档提取标题"""
-        # 尝试从第一个段落获取标题
-        for para in doc.paragraphs:
-            if para.text.strip():
-                return para.text.strip()
-        return "未命名文档"
-
-    def _extract_sections_from_word(self, doc) -> List[Dict]:
-        """从Word文档提取章节结构"""
-        sections = []
-        current_section = None
-        current_content = []
-
-        for para in doc.paragraphs:
-            text = para.text.strip()
-            if not text:
-                continue
-
-            # 判断是否为标题
-            if para.style.name.startswith('Heading'):
-                # 保存上一个章节
-                if current_section:
-                    current_section['content'] = '\n'.join(current_content)
-                    sections.append(current_section)
+    def _get_heading_levels(self, doc) -> Tuple[Dict[str, Optional[int]], Optional[int]]:
+        """
+        预先计算段落样式ID对应的标题级别（非标题样式为None）
 
-                # 提取标题级别
-                level = self._extract_heading_level(para.style.name)
+        段落的<w:pStyle>中保存的是样式ID（中文Word中标题样式ID常为"1"、"2"），
+        需要映射到样式名称才能判断是否为Heading
 
-                # 创建新章节
-                current_section = {
-                    'heading': text,
-                    'level': level,
-                    'content': '',
-                    'subsections': []
-                }
-                current_content = []
-            else:
-                # 普通段落，加入当前章节内容
-                if current_section:
-                    current_content.append(text)
+        Returns:
+            (样式ID->标题级别, 默认段落样式的标题级别)
+        """
+        WD_STYLE_TYPE = _import_docx().enum.style.WD_STYLE_TYPE
 
-        # 保存最后一个章节
-        if current_section:
-            current_section['content'] = '\n'.join(current_content)
-            sections.append(current_section)
+        heading_levels = {}
+        for style in doc.styles:
+            if style.type != WD_STYLE_TYPE.PARAGRAPH:
+                continue
+            name = style.name or ''
+            heading_levels[style.style_id] = self._extract_heading_level(name) if name.startswith('Heading') else None
 
-        return sections
+        default_style = doc.styles.default(WD_STYLE_TYPE.PARAGRAPH)
+        default_level = heading_levels.get(default_style.style_id) if default_style is not None else None
+        return heading_levels, default_level
 
     def _extract_heading_level(self, style_name: str) -> int:
         """提取标题级别"""
-        match = re.search(r'Heading\s*(\d+)', style_name)
+        match = _HEADING_LEVEL_RE.search(style_name)
         if match:
             return int(match.group(1))
         return 1
 
-    def _is_old_doc_format(self, file_path: str) -> bool:
-        """检查文件是否是旧的.doc格式（Composite Document File）"""
+    def _read_file_header(self, file_path: str) -> bytes:
+        """读取文件头8字节（直接用os.open/os.read绕过缓冲IO层）"""
         try:
-            with open(file_path, 'rb') as f:
-                header = f.read(8)
-                # OLE/COM文档的魔数
-                return header[:8] == b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
-        except:
-            return False
+            fd = os.open(file_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        except FileNotFoundError:
+            raise FileNotFoundError(f"文件不存在: {file_path}")
+        try:
+            return os.read(fd, len(_OLE_MAGIC))
+        finally:
+            os.close(fd)
 
     def _parse_old_doc(self, file_path: str) -> Dict:
         """解析旧的.doc格式文档（使用win32com）"""
-        try:
-            import win32com.client
-            import pythoncom
-        except ImportError:
-            raise ImportError("解析.doc文件需要安装 pywin32: pip install pywin32")
+        _import_win32com()
 
-        word = None
         doc = None
-        com_initialized = False
 
         try:
-            # 初始化COM
-            pythoncom.CoInitialize()
-            com_initialized = True
-
-            # 创建Word应用程序对象
-            word = win32com.client.Dispatch("Word.Application")
-            word.Visible = False
+            # 复用当前线程的Word应用程序对象
+            word = _word_app_pool.get()
 
             # 打开文档
             abs_path = os.path.abspath(file_path)
@@ -230,16 +367,15 @@ class DocumentParser:
 
             # 获取标题（从第一行或文件名）
             title = os.path.splitext(os.path.basename(file_path))[0]
-            lines = raw_text.split('\n')
-            if lines and lines[0].strip():
-                title = lines[0].strip()
+            first_line = raw_text.split('\n', 1)[0].strip()
+            if first_line:
+                title = first_line
 
             # 简单的章节划分
             sections = self._extract_sections_from_text(raw_text)
 
-            # 关闭文档
+            # 关闭文档（Word实例保留给后续文件使用）
             doc.Close(False)
-            word.Quit()
 
             return {
                 'title': title,
@@ -262,17 +398,12 @@ class DocumentParser:
             except:
                 pass
 
-            try:
-                if word is not None:
-                    word.Quit()
-            except:
-                pass
+            _word_app_pool.discard()
 
             # 如果win32com失败，尝试用python-docx打开（可能是误判的docx文件）
             logger.info("尝试使用python-docx解析...")
             try:
-                from docx import Document
-                docx_doc = Document(file_path)
+                docx_doc = _import_docx().Document(file_path)
                 # 如果成功打开，说明这是个docx文件，重新用docx方法解析
                 logger.info("文件实际上是.docx格式，使用python-docx解析")
                 # 为避免无限递归，我们直接在这里处理
@@ -280,17 +411,11 @@ class DocumentParser:
             except Exception as e2:
                 logger.error(f"python-docx也无法打开: {e2}")
                 raise ValueError(f"无法解析文档: win32com错误({e}), python-docx错误({e2})")
-        finally:
-            if com_initialized:
-                try:
-                    pythoncom.CoUninitialize()
-                except:
-                    pass
 
     def _extract_sections_from_text(self, text: str) -> List[Dict]:
         """从纯文本中提取章节（简单实现）"""
         sections = []
-        lines = text.split('\n')
+        lines = islice(text.split('\n'), self.max_paragraphs)
 
         current_section = {
             'heading': '正文',
@@ -304,19 +429,8 @@ class DocumentParser:
             if not line:
                 continue
 
-            # 简单判断：如果是短行且可能是标题
-            is_heading = False
-            heading_keywords = ['一、', '二、', '三、', '四、', '五、', '六、', '七、', '八、', '九、', '十、',
-                              '1.', '2.', '3.', '4.', '5.',
-                              '（一）', '（二）', '（三）', '（四）', '（五）']
-
-            if len(line) < 100:  # 标题通常不会太长
-                for keyword in heading_keywords:
-                    if line.startswith(keyword):
-                        is_heading = True
-                        break
-
-            if is_heading:
+            # 简单判断：短行（标题通常不会太长）且以标题前缀开头
+            if len(line) < 100 and line.startswith(_HEADING_PREFIXES):
                 # 保存当前章节
                 if current_section['content']:
                     current_section['content'] = '\n'.join(current_section['content'])
@@ -345,40 +459,40 @@ class DocumentParser:
         }]
 
     def _parse_pdf(self, file_path: str) -> Dict:
-        """解析PDF文档"""
-        try:
-            import fitz  # PyMuPDF
-        except ImportError:
-            raise ImportError("请安装 PyMuPDF: pip install PyMuPDF")
+        """解析PDF文档（每页只解码一次，文本/章节/图片在同一轮遍历中提取）"""
+        doc = _import_fitz().open(file_path)
+
+        # 获取页数（在关闭前）
+        page_count = len(doc)
+
+        page_texts = []
+        sections = []
+        images = []
+        encoded_cache: Dict[bytes, str] = {}  # 相同图片只编码一次
 
-        doc = fitz.open(file_path)
+        # 注意：PyMuPDF 不支持多线程访问，这里按页顺序处理
+        for page_num, page in enumerate(doc):
+            page_text = page.get_text()
+            page_texts.append(page_text)
+
+            # 简单的章节提取（基于标题格式）
+            sections.extend(self._extract_sections_from_pdf(page_text))
+
+            # 提取图片
+            self._extract_images_from_pdf(doc, page, page_num, images, encoded_cache)
+
+        # 提取所有文本
+        raw_text = ''.join(page_texts)
 
         # 提取文档标题
         title = doc.metadata.get('title', '未命名文档')
         if not title or title == '未命名文档':
             # 尝试从第一页提取标题
-            if len(doc) > 0:
-                first_page_text = doc[0].get_text()
-                lines = first_page_text.split('\n')
+            if page_texts:
+                lines = page_texts[0].split('\n')
                 if lines:
                     title = lines[0].strip() or '未命名文档'
 
-        # 获取页数（在关闭前）
-        page_count = len(doc)
-
-        # 提取所有文本
-        raw_text = ""
-        for page in doc:
-            raw_text += page.get_text()
-
-        # 简单的章节提取（基于字体大小和格式）
-        sections = self._extract_sections_from_pdf(doc)
-
-        # 获取章节数（在关闭前）
-        section_count = len(sections)
-
-        # 提取图片
-        images = self._extract_images_from_pdf(doc)
         logger.info(f"从PDF文档中提取了 {len(images)} 张图片")
 
         # 关闭文档
@@ -392,179 +506,162 @@ class DocumentParser:
             'metadata': {
                 'format': 'pdf',
                 'page_count': page_count,
-                'section_count': section_count,
+                'section_count': len(sections),
                 'image_count': len(images)
             }
         }
 
-    def _extract_sections_from_pdf(self, doc) -> List[Dict]:
-        """从PDF提取章节（简化版本）"""
+    def _extract_sections_from_pdf(self, page_text: str) -> List[Dict]:
+        """从PDF单页文本提取章节（简化版本）"""
         sections = []
 
-        # 使用正则表达式识别可能的标题
-        # 通常标题格式：数字 + 点 + 空格 + 文字
-        heading_patterns = [
-            r'^\d+\.\s+(.+)$',           # 1. 标题
-            r'^第[一二三四五六七八九十\d]+章\s+(.+)$',  # 第一章 标题
-            r'^[A-Z][、.]\s+(.+)$',       # A. 标题
-        ]
+        lines = page_text.split('\n')
 
-        for page in doc:
-            text = page.get_text()
-            lines = text.split('\n')
-
-            current_section = None
-            current_content = []
+        current_section = None
+        current_content = []
 
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
 
-                # 检查是否为标题
-                is_heading = False
-                for pattern in heading_patterns:
-                    match = re.match(pattern, line)
-                    if match:
-                        # 保存上一个章节
-                        if current_section:
-                            current_section['content'] = '\n'.join(current_content)
-                            sections.append(current_section)
-
-                        # 创建新章节
-                        current_section = {
-                            'heading': line,
-                            'level': 1,
-                            'content': '',
-                            'subsections': []
-                        }
-                        current_content = []
-                        is_heading = True
-                        break
+            # 检查是否为标题（标题格式见 _PDF_HEADING_RE）
+            if _PDF_HEADING_RE.match(line):
+                # 保存上一个章节
+                if current_section:
+                    current_section['content'] = '\n'.join(current_content)
+                    sections.append(current_section)
 
-                if not is_heading and current_section:
-                    current_content.append(line)
+                # 创建新章节
+                current_section = {
+                    'heading': line,
+                    'level': 1,
+                    'content': '',
+                    'subsections': []
+                }
+                current_content = []
+            elif current_section:
+                current_content.append(line)
 
-            # 保存最后一个章节
-            if current_section:
-                current_section['content'] = '\n'.join(current_content)
-                sections.append(current_section)
+        # 保存最后一个章节
+        if current_section:
+            current_section['content'] = '\n'.join(current_content)
+            sections.append(current_section)
 
         return sections
 
-    def _extract_images_from_word(self, doc) -> List[Dict]:
-        """从Word文档中提取图片"""
+    def _extract_images_from_word(self, doc, para_index: Dict) -> List[Dict]:
+        """
+        从Word文档中提取图片
+
+        一次遍历body下所有<w:drawing>，再通过祖先段落映射回段落序号；
+        不在para_index中的段落（如表格内）与doc.paragraphs的范围一致，跳过
+        """
         images = []
+        encoded_cache: Dict[bytes, str] = {}  # 相同图片（如重复出现的logo）只编码一次
 
         try:
-            # 遍历所有段落中的runs
-            for para_idx, para in enumerate(doc.paragraphs):
-                for run in para.runs:
-                    # 检查run中是否包含图片
-                    if hasattr(run, '_element'):
-                        for drawing in run._element.findall('.//{http://schemas.openxmlformats.org/wordprocessingml/2006/main}drawing'):
-                            # 获取图片的blip信息
-                            blips = drawing.findall('.//{http://schemas.openxmlformats.org/drawingml/2006/main}blip')
-                            for blip in blips:
-                                embed_id = blip.get('{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed')
-                                if embed_id:
-                                    try:
-                                        # 获取图片数据
-                                        image_part = doc.part.related_parts[embed_id]
-                                        image_bytes = image_part.blob
-
-                                        # 转换为base64
-                                        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-
-                                        # 获取图片格式
-                                        content_type = image_part.content_type
-                                        image_format = content_type.split('/')[-1] if '/' in content_type else 'unknown'
-
-                                        images.append({
-                                            'index': len(images),
-                                            'data': image_base64,
-                                            'format': image_format,
-                                            'position': f'段落{para_idx + 1}',
-                                            'media_type': content_type
-                                        })
-
-                                        logger.debug(f"提取图片 #{len(images)}, 格式: {image_format}, 位置: 段落{para_idx + 1}")
-                                    except Exception as e:
-                                        logger.warning(f"提取图片失败: {e}")
+            for drawing in doc.element.body.iter(_QN_DRAWING):
+                para_idx = None
+                for ancestor in drawing.iterancestors(_QN_P):
+                    para_idx = para_index.get(ancestor)
+                    if para_idx is not None:
+                        break
+                if para_idx is None:
+                    continue
+
+                # 获取图片的blip信息
+                for blip in drawing.iter(_QN_BLIP):
+                    embed_id = blip.get(_QN_EMBED)
+                    if not embed_id:
+                        continue
+                    try:
+                        # 获取图片数据
+                        image_part = doc.part.related_parts[embed_id]
+                        image_bytes = image_part.blob
+
+                        # 转换为base64
+                        image_base64 = encoded_cache.get(image_bytes)
+                        if image_base64 is None:
+                            image_base64 = encoded_cache[image_bytes] = _b64encode_str(image_bytes)
+
+                        # 获取图片格式
+                        content_type = image_part.content_type
+                        image_format = content_type.split('/')[-1] if '/' in content_type else 'unknown'
+
+                        images.append({
+                            'index': len(images),
+                            'data': image_base64,
+                            'format': image_format,
+                            'position': f'段落{para_idx + 1}',
+                            'media_type': content_type
+                        })
+
+                        logger.debug(f"提取图片 #{len(images)}, 格式: {image_format}, 位置: 段落{para_idx + 1}")
+                    except Exception as e:
+                        logger.warning(f"提取图片失败: {e}")
         except Exception as e:
             logger.error(f"提取Word图片时发生错误: {e}")
 
         return images
 
-    def _extract_images_from_pdf(self, doc) -> List[Dict]:
-        """从PDF文档中提取图片"""
-        images = []
+    def _extract_images_from_pdf(self, doc, page, page_num: int, images: List[Dict],
+                                 encoded_cache: Dict[bytes, str]):
+        """从PDF单页中提取图片，追加到images列表"""
+        b64encode = _b64encode_str
 
         try:
-            import fitz  # PyMuPDF
-
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                image_list = page.get_images()
+            image_list = page.get_images()
 
-                for img_index, img in enumerate(image_list):
-                    try:
-                        xref = img[0]  # 图片的xref索引
-                        base_image = doc.extract_image(xref)
-
-                        if base_image:
-                            image_bytes = base_image["image"]
-                            image_ext = base_image["ext"]
-
-                            # 转换为base64
-                            image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-
-                            # 映射格式到media_type
-                            media_type_map = {
-                                'png': 'image/png',
-                                'jpg': 'image/jpeg',
-                                'jpeg': 'image/jpeg',
-                                'gif': 'image/gif',
-                                'bmp': 'image/bmp',
-                                'tiff': 'image/tiff'
-                            }
-                            media_type = media_type_map.get(image_ext.lower(), f'image/{image_ext}')
-
-                            images.append({
-                                'index': len(images),
-                                'data': image_base64,
-                                'format': image_ext,
-                                'position': f'第{page_num + 1}页',
-                                'media_type': media_type
-                            })
-
-                            logger.debug(f"提取图片 #{len(images)}, 格式: {image_ext}, 位置: 第{page_num + 1}页")
-                    except Exception as e:
-                        logger.warning(f"提取PDF图片失败: {e}")
+            for img_index, img in enumerate(image_list):
+                try:
+                    xref = img[0]  # 图片的xref索引
+                    base_image = doc.extract_image(xref)
+
+                    if base_image:
+                        image_bytes = base_image["image"]
+                        image_ext = base_image["ext"]
+
+                        # 转换为base64
+                        image_base64 = encoded_cache.get(image_bytes)
+                        if image_base64 is None:
+                            image_base64 = encoded_cache[image_bytes] = b64encode(image_bytes)
+
+                        # 映射格式到media_type
+                        media_type = _MEDIA_TYPE_MAP.get(image_ext.lower(), f'image/{image_ext}')
+
+                        images.append({
+                            'index': len(images),
+                            'data': image_base64,
+                            'format': image_ext,
+                            'position': f'第{page_num + 1}页',
+                            'media_type': media_type
+                        })
+
+                        logger.debug(f"提取图片 #{len(images)}, 格式: {image_ext}, 位置: 第{page_num + 1}页")
+                except Exception as e:
+                    logger.warning(f"提取PDF图片失败: {e}")
         except Exception as e:
             logger.error(f"提取PDF图片时发生错误: {e}")
 
-        return images
-
     def extract_keywords(self, text: str) -> List[str]:
-        """提取关键词（简单版本）"""
-        # 移除标点符号
-        cleaned = re.sub(r'[^\w\s]', ' ', text)
-
-        # 分词（简单按空格分割）
-        words = cleaned.split()
-
-        # 过滤停用词和短词
-        stopwords = {'的', '了', '和', '是', '在', '有', '与', '等', '及', '为'}
-        keywords = [w for w in words if len(w) > 1 and w not in stopwords]
-
-        # 统计词频
-        from collections import Counter
-        word_freq = Counter(keywords)
-
-        # 返回前20个高频词
+        """提取关键词（按词频取前20个）"""
+        word_freq = Counter(
+            word for word in self._iter_tokens(text)
+            if len(word) > 1 and word not in _STOPWORDS
+        )
         return [word for word, _ in word_freq.most_common(20)]
 
+    @staticmethod
+    def _iter_tokens(text: str):
+        """逐个产出分词结果，汉字片段优先使用jieba细分"""
+        for match in _TOKEN_RE.finditer(text):
+            token = match.group()
+            if jieba is not None and token[0] >= '\u4e00':
+                yield from jieba.cut(token)
+            else:
+                yield token
+
 
 # 使用示例
 if __name__ == "__main__":
@@ -3,6 +3,7 @@
 """
 import logging
 import os
+from concurrent.futures import ProcessPoolExecutor
 from generator import TestCaseGenerator
 
 # 配置日志
@@ -77,14 +78,26 @@ def example_2_custom_config():
     print(f"结果：{result}")
 
 
+# 批量处理时每个工作进程持有一个生成器
+_batch_generator = None
+
+
+def _init_batch_worker(ai_model: str):
+    """工作进程初始化：创建本进程的生成器"""
+    global _batch_generator
+    _batch_generator = TestCaseGenerator(ai_model=ai_model)
+
+
+def _generate_in_worker(document_path: str):
+    return _batch_generator.generate(document_path)
+
+
 def example_3_batch_processing():
     """示例3：批量处理多个文档"""
     print("\n" + "="*60)
     print("示例3：批量处理多个文档")
     print("="*60)
 
-    generator = TestCaseGenerator(ai_model="openai")
-
     # 需求文档列表
     documents = [
         "需求文档1.docx",
@@ -92,14 +105,26 @@ def example_3_batch_processing():
         "需求文档3.docx"
     ]
 
-    results = []
+    existing_documents = []
     for doc in documents:
         if not os.path.exists(doc):
             print(f"⚠️ 跳过不存在的文档：{doc}")
             continue
+        existing_documents.append(doc)
+
+    if not existing_documents:
+        return
+
+    # 各文档相互独立，使用多进程并行解析和生成
+    max_workers = min(len(existing_documents), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             initializer=_init_batch_worker,
+                             initargs=("openai",)) as executor:
+        batch_results = list(executor.map(_generate_in_worker, existing_documents))
 
+    results = []
+    for doc, result in zip(existing_documents, batch_results):
         print(f"\n处理：{doc}")
-        result = generator.generate(doc)
 
         if result['success']:
             print(f"  ✅ 成功 - {result['statistics']['total_cases']} 个用例")
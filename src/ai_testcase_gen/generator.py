@@ -1,38 +1,282 @@
 """
 测试用例生成器：核心业务逻辑
 """
+import copy
+import functools
+import hashlib
+import json
 import logging
 import os
-from typing import Dict, List, Optional, Callable
+import string
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Callable
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 
 try:
     from .document_parser import DocumentParser
     from .ai_service import AIServiceFactory, AIServiceBase
     from .xmind_builder import XMindBuilder
+    from .parse_cache import create_parse_cache
+    from .result_cache import create_result_cache, document_fingerprint
     from .prompts import (
-        MAIN_EXTRACTION_PROMPT,
         DEFECT_DETECTION_PROMPT,
-        QUESTION_GENERATION_PROMPT
+        QUESTION_GENERATION_PROMPT,
+        COMBINED_ANALYSIS_PROMPT,
+        MODULE_IDENTIFICATION_PROMPT,
+        SINGLE_MODULE_TESTCASE_PROMPT,
+        BATCH_MODULE_TESTCASE_PROMPT,
+        OUTPUT_SCHEMAS,
+        render_prompt
+    )
+    from .config import (
+        DEFAULT_AI_MODEL, OUTPUT_DIR, MODULE_BATCH_SIZE, AI_CONCURRENCY_INITIAL, AI_CONCURRENCY_MAX,
+        MESSAGE_BATCH_ENABLED
     )
-    from .config import DEFAULT_AI_MODEL, OUTPUT_DIR
     from .test_conventions import find_relevant_conventions, format_conventions_for_prompt
 except ImportError:
     # 直接运行时的导入
     from document_parser import DocumentParser
     from ai_service import AIServiceFactory, AIServiceBase
     from xmind_builder import XMindBuilder
+    from parse_cache import create_parse_cache
+    from result_cache import create_result_cache, document_fingerprint
     from prompts import (
-        MAIN_EXTRACTION_PROMPT,
         DEFECT_DETECTION_PROMPT,
-        QUESTION_GENERATION_PROMPT
+        QUESTION_GENERATION_PROMPT,
+        COMBINED_ANALYSIS_PROMPT,
+        MODULE_IDENTIFICATION_PROMPT,
+        SINGLE_MODULE_TESTCASE_PROMPT,
+        BATCH_MODULE_TESTCASE_PROMPT,
+        OUTPUT_SCHEMAS,
+        render_prompt
+    )
+    from config import (
+        DEFAULT_AI_MODEL, OUTPUT_DIR, MODULE_BATCH_SIZE, AI_CONCURRENCY_INITIAL, AI_CONCURRENCY_MAX,
+        MESSAGE_BATCH_ENABLED
     )
-    from config import DEFAULT_AI_MODEL, OUTPUT_DIR
     from test_conventions import find_relevant_conventions, format_conventions_for_prompt
 
+# pyahocorasick（可选）：所有模块的关键词建成一个自动机，每个段落只扫描一次
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# 单模块测试用例的JSON结构
+MODULE_TESTCASE_SCHEMA = {
+    "type": "object",
+    "required": ["module_name"],
+    "properties": {
+        "module_name": {"type": "string"},
+        "test_types": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "scenarios": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "test_cases": {"type": "array", "items": {"type": "object"}},
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
+
+# fastjsonschema（可选）：schema预编译为校验函数；未安装时只检查顶层结构
+try:
+    import fastjsonschema
+
+    _validate_module_testcases = fastjsonschema.compile(MODULE_TESTCASE_SCHEMA)
+    ModuleSchemaError = fastjsonschema.JsonSchemaException
+except ImportError:
+    class ModuleSchemaError(ValueError):
+        """模块测试用例JSON结构不正确"""
+
+    def _validate_module_testcases(data):
+        if not isinstance(data, dict) or 'module_name' not in data:
+            raise ModuleSchemaError("缺少module_name")
+        return data
+
+# orjson（可选）：序列化比标准库快数倍，用于统计AI输出量（UTF-8字节数，只用于比较吞吐量）
+try:
+    import orjson
+
+    def _output_size(result: Any) -> int:
+        return len(orjson.dumps(result))
+except ImportError:
+    def _output_size(result: Any) -> int:
+        return len(json.dumps(result, ensure_ascii=False).encode('utf-8'))
+
+# tiktoken（可选）：按token预算截断输入；未安装时按字符数截断
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
 logger = logging.getLogger(__name__)
 
+# 输入内容的token预算（未安装tiktoken时使用对应的字符数）
+MODULE_IDENTIFICATION_MAX_TOKENS = 6000
+MODULE_IDENTIFICATION_MAX_CHARS = 8000
+RELATED_CONTENT_MAX_TOKENS = 3000
+RELATED_CONTENT_MAX_CHARS = 4000
+
+# 模块测试用例的输出token上限：prompt限制每个模块不超过10个用例（约2-3k tokens），留出余量；
+# 上限不影响实际生成耗时，但API按max_tokens预估输出限流额度，过大会挤占并发
+MODULE_TESTCASE_MAX_OUTPUT_TOKENS = 6000
+BATCH_TESTCASE_MAX_OUTPUT_TOKENS = 16000
+
+# 共享线程池大小（实际并发由 _AdaptiveConcurrency 控制）
+_EXECUTOR_MAX_WORKERS = max(1, AI_CONCURRENCY_MAX)
+
+# 置信度 -> 统计字段
+_CONFIDENCE_STAT_KEYS = {
+    'high': 'green_cases',
+    'medium': 'yellow_cases',
+    'low': 'red_cases',
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(model: Optional[str]):
+    """获取模型对应的tokenizer，不可用时返回None"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        pass
+    return _fallback_encoding()
+
+
+@functools.lru_cache(maxsize=None)
+def _fallback_encoding():
+    """通用tokenizer；加载失败（如离线无法下载词表）时返回None并缓存，不再重复尝试"""
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"加载tokenizer失败({e})，按字符数截断输入")
+        return None
+
+
+def _truncate_text(text: str, max_tokens: int, max_chars: int, model: Optional[str] = None) -> str:
+    """
+    按段落截断文本，使其不超过token预算（无tokenizer时按字符数）
+
+    按段落累加；放不下的段落保留能容纳的前缀，用满剩余预算
+    """
+    encoding = _get_encoding(model)
+    if encoding is None:
+        if len(text) <= max_chars:
+            return text
+        measure, budget = len, max_chars
+        prefix = lambda s, n: s[:n]
+    else:
+        measure = lambda s: len(encoding.encode(s, disallowed_special=()))
+        budget = max_tokens
+        prefix = lambda s, n: encoding.decode(encoding.encode(s, disallowed_special=())[:n])
+
+    kept = []
+    used = 0
+    for para in text.split('\n'):
+        sep = 1 if kept else 0  # 换行符
+        cost = measure(para) + sep
+        if used + cost > budget:
+            remaining = budget - used - sep
+            if remaining > 0:
+                kept.append(prefix(para, remaining))
+            break
+        kept.append(para)
+        used += cost
+
+    return '\n'.join(kept)
+
+
+@functools.lru_cache(maxsize=None)
+def _static_prefix(template: str) -> str:
+    """prompt模板第一个占位符之前的静态文本（即格式化后prompt的固定开头）"""
+    parts = []
+    for literal_text, field_name, _, _ in string.Formatter().parse(template):
+        parts.append(literal_text)
+        if field_name is not None:
+            break
+    return ''.join(parts)
+
+
+class _AdaptiveConcurrency:
+    """
+    AI请求并发数自适应控制
+
+    每完成window个请求统计一次吞吐量（输出字节数/秒）：吞吐量上升则继续沿当前方向调整并发上限，
+    下降则反向调整；请求失败时立即降低并发上限
+    """
+
+    def __init__(self, initial: int, maximum: int, window: int = 3):
+        self.maximum = max(1, maximum)
+        self.limit = max(1, min(initial, self.maximum))
+        self.window = window
+        self._active = 0
+        self._cond = threading.Condition()
+        self._direction = 1
+        self._last_throughput: Optional[float] = None
+        self._window_start: Optional[float] = None
+        self._window_count = 0
+        self._window_size = 0
+
+    def acquire(self):
+        """等待空闲名额"""
+        with self._cond:
+            while self._active >= self.limit:
+                self._cond.wait()
+            self._active += 1
+            if self._window_start is None:
+                self._window_start = time.monotonic()
+
+    def release(self, output_size: int = 0, failed: bool = False):
+        """归还名额并记录本次请求的输出量"""
+        with self._cond:
+            self._active -= 1
+            if failed:
+                self._set_limit(self.limit - 1)
+                self._direction = -1
+                self._last_throughput = None
+                self._reset_window()
+            else:
+                self._window_count += 1
+                self._window_size += output_size
+                if self._window_count >= self.window:
+                    self._adjust()
+            self._cond.notify_all()
+
+    def _adjust(self):
+        throughput = self._window_size / max(time.monotonic() - self._window_start, 1e-6)
+        if self._last_throughput is not None and throughput < self._last_throughput:
+            self._direction = -self._direction
+        self._last_throughput = throughput
+        self._set_limit(self.limit + self._direction)
+        self._reset_window()
+
+    def _set_limit(self, limit: int):
+        limit = max(1, min(limit, self.maximum))
+        if limit != self.limit:
+            logger.info(f"AI请求并发数调整: {self.limit} -> {limit}")
+            self.limit = limit
+
+    def _reset_window(self):
+        # 没有进行中的请求时，等下一个请求开始再计时（不把空闲时间计入吞吐量）
+        self._window_start = time.monotonic() if self._active else None
+        self._window_count = 0
+        self._window_size = 0
+
 
 class TestCaseGenerator:
     """测试用例生成器"""
@@ -51,6 +295,8 @@ class TestCaseGenerator:
         """
         self.document_parser = DocumentParser()
         self.xmind_builder = XMindBuilder()
+        self.parse_cache = create_parse_cache()
+        self.result_cache = create_result_cache()
 
         # 初始化AI服务
         if ai_service:
@@ -61,8 +307,100 @@ class TestCaseGenerator:
         # 进度回调函数
         self.progress_callback: Optional[Callable[[str, int], None]] = None
 
+        # AI调用共用的线程池（首次使用时创建，多次generate之间复用）
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+        # AI请求并发控制（线程池按上限创建，实际并发按吞吐量自动调整）
+        self._concurrency = _AdaptiveConcurrency(AI_CONCURRENCY_INITIAL, _EXECUTOR_MAX_WORKERS)
+
+        # 进行中的AI请求（相同prompt的并发请求共用一次调用）
+        self._inflight: Dict[str, list] = {}  # key -> [Future, 是否有其他调用方等待]
+        self._inflight_lock = threading.Lock()
+
         logger.info(f"测试用例生成器初始化完成，使用模型：{ai_model}")
 
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """
+        共享线程池
+
+        只用于提交不再等待其他线程池任务的AI调用，避免多个generate并发时worker互相等待
+        """
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=_EXECUTOR_MAX_WORKERS,
+                        thread_name_prefix='tcgen'
+                    )
+        return self._executor
+
+    def close(self):
+        """关闭共享线程池（等待已提交的任务完成）"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _generate_json(self, prompt: str, template: Optional[str] = None, **kwargs) -> Dict:
+        """
+        调用AI生成JSON，相同参数的并发请求合并为一次调用
+
+        有请求合并时各调用方拿到的都是结果的副本（调用方可能会修改返回的dict）
+
+        Args:
+            prompt: 完整prompt
+            template: 生成prompt的模板；AI服务支持提示缓存时，模板的静态开头作为缓存前缀；
+                AI服务支持结构化输出时，按模板对应的schema约束输出
+        """
+        key = hashlib.blake2b(
+            f"{sorted(kwargs.items())}|{prompt}".encode("utf-8"), digest_size=16
+        ).hexdigest()
+
+        if template and getattr(self.ai_service, 'supports_prompt_cache', False):
+            kwargs['cache_prefix'] = _static_prefix(template)
+        if template in OUTPUT_SCHEMAS and getattr(self.ai_service, 'supports_output_schema', False):
+            kwargs['output_schema'] = OUTPUT_SCHEMAS[template]
+
+        with self._inflight_lock:
+            entry = self._inflight.get(key)
+            is_owner = entry is None
+            if is_owner:
+                entry = self._inflight[key] = [Future(), False]
+            else:
+                entry[1] = True  # 标记有其他调用方在等待
+
+        future = entry[0]
+        if not is_owner:
+            logger.info("相同请求正在进行中，等待其结果")
+            return copy.deepcopy(future.result())
+
+        self._concurrency.acquire()
+        output_size = 0
+        failed = True
+        try:
+            result = self.ai_service.generate_json(prompt, **kwargs)
+            output_size = _output_size(result)
+            failed = False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._concurrency.release(output_size, failed)
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+                shared = entry[1]
+
+        future.set_result(result)
+        return copy.deepcopy(result) if shared else result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
     def set_progress_callback(self, callback: Callable[[str, int], None]):
         """设置进度回调函数
 
@@ -84,7 +422,10 @@ class TestCaseGenerator:
         enable_defect_detection: bool = True,
         enable_question_generation: bool = True,
         enable_image_analysis: bool = True,
-        max_images: int = 10
+        max_images: int = 10,
+        image_concurrency: int = 4,
+        combined_analysis: bool = True,
+        urgent: bool = False
     ) -> Dict:
         """
         从需求文档生成测试用例XMind文件
@@ -94,6 +435,12 @@ class TestCaseGenerator:
             output_filename: 输出文件名（不指定则自动生成）
             enable_defect_detection: 是否启用需求缺陷检测
             enable_question_generation: 是否启用问题清单生成
+            enable_image_analysis: 是否启用图片分析
+            max_images: 最多分析的图片数量
+            image_concurrency: 图片分析并发数（受视觉API限流约束）
+            combined_analysis: 模块识别、缺陷检测、问题清单合并为一次AI请求
+                （需同时启用缺陷检测和问题清单；失败时回退为分别请求）
+            urgent: 紧急任务，开启MESSAGE_BATCH时也逐请求并发生成模块测试用例，不走Message Batches API
 
         Returns:
             生成结果字典：
@@ -118,61 +465,23 @@ class TestCaseGenerator:
             # Step 1: 解析文档
             self._report_progress("正在解析文档...", 10)
             logger.info("Step 1: 解析文档...")
-            parsed_doc = self.document_parser.parse(document_path)
+            file_hash = self._get_file_hash(document_path)
+            parsed_doc = self._parse_document(document_path, file_hash)
             logger.info(f"文档解析完成，标题：{parsed_doc['title']}")
             self._report_progress(f"文档解析完成：{parsed_doc['title']}", 20)
 
-            # Step 1.5: 分析文档图片 (如果启用)
-            if enable_image_analysis and parsed_doc.get('images'):
-                image_count = len(parsed_doc['images'])
-                logger.info(f"发现 {image_count} 张图片，开始分析...")
-                self._report_progress(f"正在分析文档图片 (共{image_count}张)...", 25)
-
-                image_descriptions = self._analyze_images(parsed_doc['images'], max_images)
-
-                # 将图片描述整合到文档文本中
-                if image_descriptions:
-                    parsed_doc['raw_text'] += "\n\n=== 文档中的图片内容 ===\n"
-                    for desc in image_descriptions:
-                        parsed_doc['raw_text'] += f"\n[图片{desc['index']+1}] 位置:{desc['position']}\n{desc['description']}\n"
-                    logger.info(f"成功分析 {len(image_descriptions)} 张图片")
-
-            # Step 2-4: 并行执行AI任务
-            self._report_progress("正在并行调用AI分析...", 30)
-            logger.info("Step 2-4: 并行执行AI分析任务...")
-
-            test_data = {}
-            defects = []
-            questions = []
-
-            # 使用线程池并行执行AI调用
-            with ThreadPoolExecutor(max_workers=3) as executor:
-                # 提交所有AI任务
-                future_test_cases = executor.submit(self._extract_test_cases, parsed_doc)
-                future_defects = executor.submit(self._detect_defects, parsed_doc) if enable_defect_detection else None
-                future_questions = executor.submit(self._generate_questions, parsed_doc) if enable_question_generation else None
-
-                # 收集结果并报告进度
-                completed_tasks = 0
-                total_tasks = 1 + (1 if enable_defect_detection else 0) + (1 if enable_question_generation else 0)
-
-                for future in as_completed([f for f in [future_test_cases, future_defects, future_questions] if f is not None]):
-                    completed_tasks += 1
-                    progress = 30 + int(completed_tasks / total_tasks * 50)
-
-                    if future == future_test_cases:
-                        test_data = future.result()
-                        self._report_progress(f"测试用例提取完成 ({completed_tasks}/{total_tasks})", progress)
-                    elif future == future_defects:
-                        defects = future.result()
-                        self._report_progress(f"需求缺陷检测完成 ({completed_tasks}/{total_tasks})", progress)
-                    elif future == future_questions:
-                        questions = future.result()
-                        self._report_progress(f"问题清单生成完成 ({completed_tasks}/{total_tasks})", progress)
-
-            # 合并结果
-            test_data['defects'] = defects
-            test_data['questions'] = questions
+            # 内容相同或几乎相同的文档直接复用上次的生成结果
+            cache_entry = self._result_cache_entry(
+                parsed_doc, enable_defect_detection, enable_question_generation,
+                max_images if enable_image_analysis else 0
+            )
+            test_data = self._lookup_result_cache(cache_entry)
+            if test_data is None:
+                test_data = self._analyze_document(
+                    parsed_doc, file_hash, enable_defect_detection, enable_question_generation,
+                    enable_image_analysis, max_images, image_concurrency, combined_analysis, urgent
+                )
+                self._store_result_cache(cache_entry, test_data)
 
             logger.info("AI分析任务全部完成")
             self._report_progress("AI分析完成，正在生成XMind文件...", 80)
@@ -209,45 +518,251 @@ class TestCaseGenerator:
                 'error': str(e)
             }
 
-    def _extract_test_cases(self, parsed_doc: Dict) -> Dict:
+    def _analyze_document(
+        self,
+        parsed_doc: Dict,
+        file_hash: Optional[str],
+        enable_defect_detection: bool,
+        enable_question_generation: bool,
+        enable_image_analysis: bool,
+        max_images: int,
+        image_concurrency: int,
+        combined_analysis: bool,
+        urgent: bool = False
+    ) -> Dict:
+        """分析图片并调用AI提取测试用例、缺陷和问题清单（Step 1.5 - Step 4）"""
+        # 缺陷检测、问题清单不依赖图片内容，先提交，与图片分析并行
+        # （合并分析模式下由一次请求完成，需等图片内容整合后再发起）
+        use_combined = combined_analysis and enable_defect_detection and enable_question_generation
+        review_futures = (None, None)
+        if not use_combined:
+            review_futures = self._submit_reviews(
+                dict(parsed_doc), enable_defect_detection, enable_question_generation
+            )
+
+        # Step 1.5: 分析文档图片 (如果启用)
+        if enable_image_analysis and parsed_doc.get('images'):
+            image_count = len(parsed_doc['images'])
+            logger.info(f"发现 {image_count} 张图片，开始分析...")
+            self._report_progress(f"正在分析文档图片 (共{image_count}张)...", 25)
+
+            image_descriptions = self._analyze_images_cached(
+                parsed_doc['images'], max_images, image_concurrency, file_hash
+            )
+
+            # 将图片描述整合到文档文本中
+            if image_descriptions:
+                parts = [parsed_doc['raw_text'], "\n\n=== 文档中的图片内容 ===\n"]
+                parts.extend(
+                    f"\n[图片{desc['index']+1}] 位置:{desc['position']}\n{desc['description']}\n"
+                    for desc in image_descriptions
+                )
+                parsed_doc['raw_text'] = ''.join(parts)
+                logger.info(f"成功分析 {len(image_descriptions)} 张图片")
+
+        # Step 2-4: 执行AI分析任务
+        combined_result = None
+        if use_combined:
+            self._report_progress("正在调用AI分析（模块识别+缺陷检测+问题清单）...", 30)
+            logger.info("Step 2-4: 合并执行AI分析任务...")
+            combined_result = self._analyze_combined(parsed_doc, urgent)
+            if combined_result is None:
+                review_futures = self._submit_reviews(parsed_doc, True, True)
+
+        if combined_result is not None:
+            test_data, defects, questions = combined_result
+        else:
+            test_data, defects, questions = self._analyze_separately(parsed_doc, *review_futures, urgent=urgent)
+
+        # 合并结果
+        test_data['defects'] = defects
+        test_data['questions'] = questions
+
+        return test_data
+
+    def _result_cache_entry(self, parsed_doc: Dict, enable_defect_detection: bool,
+                            enable_question_generation: bool, max_images: int):
+        """生成结果缓存的(配置标签, 文档指纹)；未开启缓存时返回None"""
+        if self.result_cache is None:
+            return None
+        model = getattr(self.ai_service, 'model', type(self.ai_service).__name__)
+        tag = f"{model}|defects={enable_defect_detection}|questions={enable_question_generation}|images={max_images}"
+        images = parsed_doc.get('images', [])[:max_images]
+        return tag, document_fingerprint(parsed_doc['raw_text'], images)
+
+    def _lookup_result_cache(self, cache_entry) -> Optional[Dict]:
+        """查找相似文档的生成结果"""
+        if cache_entry is None:
+            return None
+        hit = self.result_cache.lookup(*cache_entry)
+        if hit is None:
+            return None
+        test_data, similarity = hit
+        logger.info(f"命中生成结果缓存（文档相似度 {similarity:.1%}），跳过AI分析")
+        self._report_progress("命中生成结果缓存，跳过AI分析", 80)
+        return test_data
+
+    def _store_result_cache(self, cache_entry, test_data: Dict):
+        """保存生成结果（没有生成任何模块时不缓存）"""
+        if cache_entry is None or not test_data.get('modules'):
+            return
+        self.result_cache.add(*cache_entry, test_data)
+
+    def _get_file_hash(self, document_path: str) -> Optional[str]:
+        """文档内容哈希（未开启解析缓存或文件不可读时返回None）"""
+        if self.parse_cache is None or not os.path.isfile(document_path):
+            return None
+        return self.parse_cache.file_hash(document_path)
+
+    def _parse_document(self, document_path: str, file_hash: Optional[str]) -> Dict:
+        """解析文档，相同内容的文档直接使用缓存结果"""
+        if file_hash is None:
+            return self.document_parser.parse(document_path)
+
+        cache_key = f"parse:{file_hash}:{self.document_parser.max_paragraphs}"
+        parsed_doc = self.parse_cache.get(cache_key)
+        if parsed_doc is not None:
+            logger.info("命中文档解析缓存")
+            return parsed_doc
+
+        parsed_doc = self.document_parser.parse(document_path)
+        self.parse_cache.set(cache_key, parsed_doc)
+        return parsed_doc
+
+    def _analyze_images_cached(self, images: List[Dict], max_images: int, image_concurrency: int,
+                               file_hash: Optional[str]) -> List[Dict]:
+        """分析文档图片，相同文档+模型的分析结果直接使用缓存"""
+        if file_hash is None:
+            return self._analyze_images(images, max_images, image_concurrency)
+
+        model = getattr(self.ai_service, 'model', type(self.ai_service).__name__)
+        cache_key = f"images:{file_hash}:{max_images}:{model}"
+        descriptions = self.parse_cache.get(cache_key)
+        if descriptions is not None:
+            logger.info("命中图片分析缓存")
+            return descriptions
+
+        descriptions = self._analyze_images(images, max_images, image_concurrency)
+        if descriptions:
+            self.parse_cache.set(cache_key, descriptions)
+        return descriptions
+
+    def _analyze_combined(self, parsed_doc: Dict, urgent: bool = False):
+        """
+        一次AI请求完成模块识别、缺陷检测和问题清单，再为各模块生成测试用例
+
+        Returns:
+            (test_data, defects, questions)；文档超出模块识别的token预算、合并请求失败或未识别到模块时返回None
+        """
+        # 一次8000 tokens的回复要同时容纳模块、缺陷和问题清单；长文档的回复会被截断导致解析失败，
+        # 白白多花一次请求后仍要回退，所以超出模块识别输入预算的文档直接分别请求
+        raw_text = parsed_doc['raw_text']
+        truncated = self._truncate_for_model(raw_text, MODULE_IDENTIFICATION_MAX_TOKENS, MODULE_IDENTIFICATION_MAX_CHARS)
+        if len(truncated) < len(raw_text):
+            logger.info("文档超出模块识别的输入预算，不使用合并分析，改为分别请求")
+            return None
+
+        prompt = render_prompt(
+            COMBINED_ANALYSIS_PROMPT,
+            title=parsed_doc['title'],
+            content=raw_text
+        )
+
+        try:
+            result = self._generate_json(prompt, COMBINED_ANALYSIS_PROMPT, max_tokens=8000)
+        except Exception as e:
+            logger.warning(f"合并分析请求失败({e})，回退为分别请求")
+            return None
+
+        identified_modules = result.get('modules') if isinstance(result, dict) else None
+        if not identified_modules:
+            logger.warning("合并分析未识别到功能模块，回退为分别请求")
+            return None
+
+        defects = result.get('defects') or []
+        questions = result.get('questions') or []
+        logger.info(
+            f"识别到 {len(identified_modules)} 个功能模块，"
+            f"检测到 {len(defects)} 个需求缺陷，生成了 {len(questions)} 个待澄清问题"
+        )
+        self._report_progress("需求缺陷检测与问题清单完成，正在生成测试用例...", 45)
+
+        try:
+            test_data = self._generate_test_cases(identified_modules, raw_text, urgent)
+        except Exception as e:
+            logger.error(f"测试用例提取失败: {e}", exc_info=True)
+            test_data = {'modules': [], 'questions': [], 'defects': []}
+        self._report_progress("测试用例提取完成", 80)
+
+        return test_data, defects, questions
+
+    def _submit_reviews(self, parsed_doc: Dict, enable_defect_detection: bool, enable_question_generation: bool):
+        """
+        向线程池提交缺陷检测、问题清单任务
+
+        Returns:
+            (缺陷检测Future, 问题清单Future)，未启用的任务为None
+        """
+        future_defects = self.executor.submit(self._detect_defects, parsed_doc) if enable_defect_detection else None
+        future_questions = self.executor.submit(self._generate_questions, parsed_doc) if enable_question_generation else None
+        return future_defects, future_questions
+
+    def _analyze_separately(self, parsed_doc: Dict, future_defects: Optional[Future], future_questions: Optional[Future],
+                            urgent: bool = False):
+        """
+        提取测试用例，并收集已提交的缺陷检测、问题清单结果（各自独立请求）
+
+        Returns:
+            (test_data, defects, questions)
+        """
+        self._report_progress("正在并行调用AI分析...", 30)
+        logger.info("Step 2-4: 并行执行AI分析任务...")
+
+        defects = []
+        questions = []
+
+        total_tasks = 1 + (future_defects is not None) + (future_questions is not None)
+
+        # 测试用例提取在当前线程执行（其内部会再向线程池提交模块任务）
+        test_data = self._extract_test_cases(parsed_doc, urgent)
+        completed_tasks = 1
+        self._report_progress(
+            f"测试用例提取完成 ({completed_tasks}/{total_tasks})",
+            30 + int(completed_tasks / total_tasks * 50)
+        )
+
+        # 收集结果并报告进度
+        for future in as_completed([f for f in [future_defects, future_questions] if f is not None]):
+            completed_tasks += 1
+            progress = 30 + int(completed_tasks / total_tasks * 50)
+
+            if future == future_defects:
+                defects = future.result()
+                self._report_progress(f"需求缺陷检测完成 ({completed_tasks}/{total_tasks})", progress)
+            elif future == future_questions:
+                questions = future.result()
+                self._report_progress(f"问题清单生成完成 ({completed_tasks}/{total_tasks})", progress)
+
+        return test_data, defects, questions
+
+    def _extract_test_cases(self, parsed_doc: Dict, urgent: bool = False) -> Dict:
         """使用AI提取测试用例（两阶段分批生成）"""
         try:
             # 第一阶段：识别功能模块
             logger.info("【第1阶段】识别功能模块...")
-            try:
-                from .prompts import MODULE_IDENTIFICATION_PROMPT, SINGLE_MODULE_TESTCASE_PROMPT
-            except ImportError:
-                from prompts import MODULE_IDENTIFICATION_PROMPT, SINGLE_MODULE_TESTCASE_PROMPT
-
-            module_prompt = MODULE_IDENTIFICATION_PROMPT.format(
+            module_prompt = render_prompt(
+                MODULE_IDENTIFICATION_PROMPT,
                 title=parsed_doc['title'],
-                content=parsed_doc['raw_text'][:8000]  # 限制输入长度
+                content=self._truncate_for_model(
+                    parsed_doc['raw_text'], MODULE_IDENTIFICATION_MAX_TOKENS, MODULE_IDENTIFICATION_MAX_CHARS
+                )
             )
 
-            module_result = self.ai_service.generate_json(module_prompt, max_tokens=4000)
+            module_result = self._generate_json(module_prompt, MODULE_IDENTIFICATION_PROMPT, max_tokens=4000)
             identified_modules = module_result.get('modules', [])
             logger.info(f"识别到 {len(identified_modules)} 个功能模块")
 
-            if not identified_modules:
-                logger.warning("未识别到任何功能模块，返回空结构")
-                return {'modules': [], 'questions': [], 'defects': []}
-
-            # 第二阶段：并发生成每个模块的测试用例
-            logger.info("【第2阶段】为每个模块生成测试用例(并发处理)...")
-
-            all_modules = self._generate_modules_concurrent(
-                identified_modules,
-                parsed_doc['raw_text'],
-                SINGLE_MODULE_TESTCASE_PROMPT
-            )
-
-            logger.info(f"测试用例生成完成,共 {len(all_modules)} 个模块")
-
-            return {
-                'modules': all_modules,
-                'questions': [],
-                'defects': []
-            }
+            return self._generate_test_cases(identified_modules, parsed_doc['raw_text'], urgent)
 
         except Exception as e:
             logger.error(f"测试用例提取失败: {e}", exc_info=True)
@@ -257,123 +772,398 @@ class TestCaseGenerator:
                 'defects': []
             }
 
+    def _generate_test_cases(self, identified_modules: list, full_text: str, urgent: bool = False) -> Dict:
+        """第二阶段：为已识别的模块生成测试用例（非紧急任务可通过Message Batches API生成）"""
+        if not identified_modules:
+            logger.warning("未识别到任何功能模块，返回空结构")
+            return {'modules': [], 'questions': [], 'defects': []}
+
+        # 并发生成每个模块的测试用例
+        logger.info("【第2阶段】为每个模块生成测试用例(并发处理)...")
+
+        if MESSAGE_BATCH_ENABLED and not urgent and getattr(self.ai_service, 'supports_message_batches', False):
+            all_modules = self._generate_modules_message_batch(
+                identified_modules,
+                full_text,
+                SINGLE_MODULE_TESTCASE_PROMPT
+            )
+        elif MODULE_BATCH_SIZE > 1:
+            all_modules = self._generate_modules_batched(
+                identified_modules,
+                full_text,
+                BATCH_MODULE_TESTCASE_PROMPT,
+                SINGLE_MODULE_TESTCASE_PROMPT
+            )
+        else:
+            all_modules = self._generate_modules_concurrent(
+                identified_modules,
+                full_text,
+                SINGLE_MODULE_TESTCASE_PROMPT
+            )
+
+        logger.info(f"测试用例生成完成,共 {len(all_modules)} 个模块")
+
+        return {
+            'modules': all_modules,
+            'questions': [],
+            'defects': []
+        }
+
     def _generate_modules_concurrent(self, identified_modules: list, full_text: str, prompt_template: str) -> list:
         """并发生成多个模块的测试用例"""
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-        import time
-
         all_modules = []
         total_modules = len(identified_modules)
 
-        # Phase 2: 5个并发worker (优化到2分钟目标)
-        max_workers = 5
-        logger.info(f"使用 {max_workers} 个并发worker处理 {total_modules} 个模块")
+        logger.info(f"并发处理 {total_modules} 个模块（当前并发数 {self._concurrency.limit}）")
+
+        related_contents = self._extract_related_contents(full_text, [
+            self._get_module_keywords(module_info, idx)
+            for idx, module_info in enumerate(identified_modules, 1)
+        ])
+
+        executor = self.executor
+
+        # 提交所有任务
+        future_to_module = {}
+        for idx, module_info in enumerate(identified_modules, 1):
+            module_name = module_info.get('module_name', f'模块{idx}')
+            future = executor.submit(
+                self._generate_single_module,
+                module_info,
+                related_contents[idx - 1],
+                prompt_template,
+                idx,
+                total_modules
+            )
+            future_to_module[future] = (module_name, idx)
+
+        # 收集结果
+        completed_count = 0
+        for future in as_completed(future_to_module):
+            module_name, idx = future_to_module[future]
+            completed_count += 1
+
+            try:
+                result = future.result(timeout=120)  # 2分钟超时
+                if result:
+                    all_modules.append(result)
+                    logger.info(f"  ✓ [{completed_count}/{total_modules}] {module_name} 完成")
+                else:
+                    logger.warning(f"  ✗ [{completed_count}/{total_modules}] {module_name} 返回空结果")
+            except TimeoutError:
+                logger.error(f"  ✗ [{completed_count}/{total_modules}] {module_name} 超时(>120秒)")
+            except Exception as e:
+                logger.error(f"  ✗ [{completed_count}/{total_modules}] {module_name} 失败: {e}")
+
+        return all_modules
 
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # 提交所有任务
-            future_to_module = {}
-            for idx, module_info in enumerate(identified_modules, 1):
+    def _generate_modules_batched(
+        self,
+        identified_modules: list,
+        full_text: str,
+        batch_template: str,
+        single_template: str,
+        batch_size: int = MODULE_BATCH_SIZE
+    ) -> list:
+        """多个模块合并为一次AI请求生成测试用例（批次之间并发），批量结果缺失的模块回退为逐模块生成"""
+        total_modules = len(identified_modules)
+        related_contents = self._extract_related_contents(full_text, [
+            self._get_module_keywords(module_info, idx)
+            for idx, module_info in enumerate(identified_modules, 1)
+        ])
+        indexed_modules = [
+            (idx, module_info, related_contents[idx - 1])
+            for idx, module_info in enumerate(identified_modules, 1)
+        ]
+        batches = [indexed_modules[i:i + batch_size] for i in range(0, total_modules, batch_size)]
+
+        logger.info(f"并发处理 {total_modules} 个模块（{len(batches)} 个批次，当前并发数 {self._concurrency.limit}）")
+
+        results = {}
+        failed_modules = []
+
+        executor = self.executor
+        future_to_batch = {
+            executor.submit(self._generate_module_batch, batch, batch_template, total_modules): batch
+            for batch in batches
+        }
+
+        for future in as_completed(future_to_batch):
+            batch = future_to_batch[future]
+            try:
+                batch_results = future.result()
+            except Exception as e:
+                logger.error(f"  ✗ 批次 {[item[0] for item in batch]} 生成失败: {e}")
+                batch_results = {}
+
+            for idx, module_info, related_content in batch:
                 module_name = module_info.get('module_name', f'模块{idx}')
-                future = executor.submit(
+                if idx in batch_results:
+                    results[idx] = batch_results[idx]
+                    logger.info(f"  ✓ [{len(results)}/{total_modules}] {module_name} 完成")
+                else:
+                    failed_modules.append((idx, module_info, related_content))
+
+        # 回退：逐模块生成
+        if failed_modules:
+            logger.warning(f"{len(failed_modules)} 个模块批量生成失败，回退为逐模块生成")
+            future_to_idx = {
+                executor.submit(
+                    self._generate_single_module,
+                    module_info,
+                    related_content,
+                    single_template,
+                    idx,
+                    total_modules
+                ): idx
+                for idx, module_info, related_content in failed_modules
+            }
+            for future in as_completed(future_to_idx):
+                result = future.result()
+                if result:
+                    results[future_to_idx[future]] = result
+
+        # 按模块识别顺序返回
+        return [results[idx] for idx in sorted(results)]
+
+    def _generate_modules_message_batch(self, identified_modules: list, full_text: str, prompt_template: str) -> list:
+        """通过Message Batches API一次提交所有模块（阻塞等待批次结束），失败的模块回退为逐模块并发生成"""
+        total_modules = len(identified_modules)
+        related_contents = self._extract_related_contents(full_text, [
+            self._get_module_keywords(module_info, idx)
+            for idx, module_info in enumerate(identified_modules, 1)
+        ])
+        prompts = {
+            f"module-{idx}": self._build_single_module_prompt(module_info, related_contents[idx - 1], prompt_template, idx)
+            for idx, module_info in enumerate(identified_modules, 1)
+        }
+
+        logger.info(f"通过Message Batches API提交 {total_modules} 个模块，等待批次处理完成...")
+        try:
+            responses = self.ai_service.generate_json_batch(
+                prompts,
+                max_tokens=MODULE_TESTCASE_MAX_OUTPUT_TOKENS,
+                cache_prefix=_static_prefix(prompt_template)
+            )
+        except Exception as e:
+            logger.error(f"  ✗ 消息批次处理失败: {e}")
+            responses = {}
+
+        results = {}
+        failed_modules = []
+        for idx, module_info in enumerate(identified_modules, 1):
+            module_testcases = responses.get(f"module-{idx}")
+            try:
+                _validate_module_testcases(module_testcases)
+            except ModuleSchemaError:
+                failed_modules.append((idx, module_info, related_contents[idx - 1]))
+                continue
+            self._log_module_cases(module_testcases, idx, total_modules)
+            results[idx] = module_testcases
+
+        # 回退：逐模块并发生成
+        if failed_modules:
+            logger.warning(f"{len(failed_modules)} 个模块批次生成失败，回退为逐模块生成")
+            future_to_idx = {
+                self.executor.submit(
                     self._generate_single_module,
                     module_info,
-                    full_text,
+                    related_content,
                     prompt_template,
                     idx,
                     total_modules
-                )
-                future_to_module[future] = (module_name, idx)
-
-            # 收集结果
-            completed_count = 0
-            for future in as_completed(future_to_module):
-                module_name, idx = future_to_module[future]
-                completed_count += 1
-
-                try:
-                    result = future.result(timeout=120)  # 2分钟超时
-                    if result:
-                        all_modules.append(result)
-                        logger.info(f"  ✓ [{completed_count}/{total_modules}] {module_name} 完成")
-                    else:
-                        logger.warning(f"  ✗ [{completed_count}/{total_modules}] {module_name} 返回空结果")
-                except TimeoutError:
-                    logger.error(f"  ✗ [{completed_count}/{total_modules}] {module_name} 超时(>120秒)")
-                except Exception as e:
-                    logger.error(f"  ✗ [{completed_count}/{total_modules}] {module_name} 失败: {e}")
+                ): idx
+                for idx, module_info, related_content in failed_modules
+            }
+            for future in as_completed(future_to_idx):
+                result = future.result()
+                if result:
+                    results[future_to_idx[future]] = result
 
-        return all_modules
+        return [results[idx] for idx in sorted(results)]
+
+    def _generate_module_batch(self, batch: list, prompt_template: str, total: int) -> Dict[int, dict]:
+        """
+        一次AI请求生成一批模块的测试用例
+
+        Args:
+            batch: [(模块序号, 模块信息, 相关需求内容), ...]
+
+        Returns:
+            {模块序号: 模块测试用例}，只包含格式正确的模块
+        """
+        blocks = []
+        for idx, module_info, related_content in batch:
+            module_name = module_info.get('module_name', f'模块{idx}')
+            blocks.append(
+                f"<<<MODULE idx={idx}>>>\n"
+                f"- 模块名称: {module_name}\n"
+                f"- 模块描述: {module_info.get('description', '')}\n\n"
+                f"相关需求内容：\n{self._truncate_related_content(related_content)}\n"
+                f"<<<END>>>"
+            )
 
-    def _generate_single_module(self, module_info: dict, full_text: str, prompt_template: str, idx: int, total: int) -> dict:
+        batch_prompt = render_prompt(prompt_template, modules_block='\n\n'.join(blocks))
+        response = self._generate_json(
+            batch_prompt,
+            prompt_template,
+            max_tokens=min(BATCH_TESTCASE_MAX_OUTPUT_TOKENS, MODULE_TESTCASE_MAX_OUTPUT_TOKENS * len(batch))
+        )
+
+        expected = {item[0] for item in batch}
+        results = {}
+        for module_testcases in response.get('modules', []) if isinstance(response, dict) else []:
+            try:
+                _validate_module_testcases(module_testcases)
+                idx = int(module_testcases.pop('module_index'))
+            except (ModuleSchemaError, KeyError, TypeError, ValueError):
+                continue
+            if idx not in expected:
+                continue
+
+            self._log_module_cases(module_testcases, idx, total)
+            results[idx] = module_testcases
+
+        return results
+
+    @staticmethod
+    def _log_module_cases(module_testcases: dict, idx: int, total: int):
+        """记录模块生成的用例数（只在INFO级别开启时统计）"""
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        case_count = sum(
+            len(sc.get('test_cases', []))
+            for tt in module_testcases.get('test_types', [])
+            for sc in tt.get('scenarios', [])
+        )
+        logger.info(f"    [{idx}/{total}] {module_testcases['module_name']}: 生成 {case_count} 个用例")
+
+    def _truncate_for_model(self, text: str, max_tokens: int, max_chars: int) -> str:
+        """按当前AI模型的tokenizer截断输入内容"""
+        return _truncate_text(text, max_tokens, max_chars, getattr(self.ai_service, 'model', None))
+
+    def _truncate_related_content(self, related_content: str) -> str:
+        """截断模块相关需求内容"""
+        return self._truncate_for_model(related_content, RELATED_CONTENT_MAX_TOKENS, RELATED_CONTENT_MAX_CHARS)
+
+    def _build_single_module_prompt(self, module_info: dict, related_content: str, prompt_template: str, idx: int) -> str:
+        """构建单个模块的测试用例生成prompt"""
+        return render_prompt(
+            prompt_template,
+            module_name=module_info.get('module_name', f'模块{idx}'),
+            module_description=module_info.get('description', ''),
+            related_content=self._truncate_related_content(related_content)
+        )
+
+    def _generate_single_module(self, module_info: dict, related_content: str, prompt_template: str, idx: int, total: int) -> dict:
         """生成单个模块的测试用例"""
         module_name = module_info.get('module_name', f'模块{idx}')
 
         try:
-            # 提取相关内容
-            keywords = module_info.get('related_keywords', [module_name])
-            related_content = self._extract_related_content(full_text, keywords)
-
-            # 构建prompt
-            single_module_prompt = prompt_template.format(
-                module_name=module_name,
-                module_description=module_info.get('description', ''),
-                related_content=related_content[:4000]
-            )
+            single_module_prompt = self._build_single_module_prompt(module_info, related_content, prompt_template, idx)
 
             # 调用AI生成
-            module_testcases = self.ai_service.generate_json(
+            module_testcases = self._generate_json(
                 single_module_prompt,
-                max_tokens=16000
+                prompt_template,
+                max_tokens=MODULE_TESTCASE_MAX_OUTPUT_TOKENS
             )
 
             # 验证结果
-            if isinstance(module_testcases, dict) and 'module_name' in module_testcases:
-                case_count = sum(
-                    len(sc.get('test_cases', []))
-                    for tt in module_testcases.get('test_types', [])
-                    for sc in tt.get('scenarios', [])
-                )
-                logger.info(f"    [{idx}/{total}] {module_name}: 生成 {case_count} 个用例")
-                return module_testcases
-            else:
-                logger.warning(f"    [{idx}/{total}] {module_name}: JSON格式不正确")
+            try:
+                _validate_module_testcases(module_testcases)
+            except ModuleSchemaError as e:
+                logger.warning(f"    [{idx}/{total}] {module_name}: JSON格式不正确({e})")
                 return None
 
+            self._log_module_cases(module_testcases, idx, total)
+            return module_testcases
+
         except Exception as e:
             logger.error(f"    [{idx}/{total}] {module_name} 生成异常: {e}")
             return None
 
+    @staticmethod
+    def _get_module_keywords(module_info: dict, idx: int) -> list:
+        """模块的相关关键词（未提供时使用模块名称）"""
+        return module_info.get('related_keywords', [module_info.get('module_name', f'模块{idx}')])
+
     def _extract_related_content(self, full_text: str, keywords: list) -> str:
         """从完整文档中提取与关键词相关的内容"""
-        if not keywords:
-            return full_text[:4000]
+        return self._extract_related_contents(full_text, [keywords])[0]
 
-        # 简单实现：查找包含关键词的段落
-        paragraphs = full_text.split('\n')
-        related_paragraphs = []
+    def _extract_related_contents(self, full_text: str, keyword_lists: List[list]) -> List[str]:
+        """
+        为多个模块一次性提取相关内容（查找包含任一关键词的段落，英文不区分大小写）
 
-        for para in paragraphs:
-            for keyword in keywords:
-                if keyword in para:
-                    related_paragraphs.append(para)
-                    break
+        Args:
+            full_text: 完整文档文本
+            keyword_lists: 每个模块的关键词列表
 
-        related_text = '\n'.join(related_paragraphs)
+        Returns:
+            与keyword_lists一一对应的相关内容
+        """
+        # 文档只切分一次；小写副本整体转换后切分，与原段落一一对应
+        paragraphs = full_text.split('\n')
+        paragraphs_lower = full_text.lower().split('\n')
+        lower_keyword_lists = [
+            [str(keyword).lower() for keyword in keywords or ()]
+            for keywords in keyword_lists
+        ]
+        related_paragraphs = [[] for _ in keyword_lists]
+
+        if ahocorasick is not None:
+            # 关键词 -> 使用该关键词的模块序号集合
+            automaton = ahocorasick.Automaton()
+            match_all = set()  # 含空关键词的模块匹配所有段落
+            for module_idx, keywords in enumerate(lower_keyword_lists):
+                for keyword in keywords:
+                    if not keyword:
+                        match_all.add(module_idx)
+                    elif automaton.exists(keyword):
+                        automaton.get(keyword).add(module_idx)
+                    else:
+                        automaton.add_word(keyword, {module_idx})
+
+            has_words = len(automaton) > 0
+            if has_words:
+                automaton.make_automaton()
+
+            for para, para_lower in zip(paragraphs, paragraphs_lower):
+                hit_modules = set(match_all)
+                if has_words:
+                    for _, module_indices in automaton.iter(para_lower):
+                        hit_modules |= module_indices
+                for module_idx in hit_modules:
+                    related_paragraphs[module_idx].append(para)
+        else:
+            for para, para_lower in zip(paragraphs, paragraphs_lower):
+                for module_idx, keywords in enumerate(lower_keyword_lists):
+                    for keyword in keywords:
+                        if keyword in para_lower:
+                            related_paragraphs[module_idx].append(para)
+                            break
 
-        # 如果提取的内容太少，补充原文
-        if len(related_text) < 500:
-            related_text = full_text[:4000]
+        related_contents = []
+        for keywords, paras in zip(keyword_lists, related_paragraphs):
+            related_text = '\n'.join(paras)
 
-        return related_text
+            # 未提供关键词或提取的内容太少，补充原文（生成prompt时再按预算截断）
+            if not keywords or len(related_text) < 500:
+                related_text = full_text
+            related_contents.append(related_text)
+
+        return related_contents
 
     def _detect_defects(self, parsed_doc: Dict) -> list:
         """检测需求缺陷"""
-        prompt = DEFECT_DETECTION_PROMPT.format(
+        prompt = render_prompt(
+            DEFECT_DETECTION_PROMPT,
             content=parsed_doc['raw_text']
         )
 
         try:
-            result = self.ai_service.generate_json(prompt)
+            result = self._generate_json(prompt, DEFECT_DETECTION_PROMPT)
             defects = result.get('defects', [])
             logger.info(f"检测到 {len(defects)} 个需求缺陷")
             return defects
@@ -383,12 +1173,13 @@ class TestCaseGenerator:
 
     def _generate_questions(self, parsed_doc: Dict) -> list:
         """生成问题清单"""
-        prompt = QUESTION_GENERATION_PROMPT.format(
+        prompt = render_prompt(
+            QUESTION_GENERATION_PROMPT,
             content=parsed_doc['raw_text']
         )
 
         try:
-            result = self.ai_service.generate_json(prompt)
+            result = self._generate_json(prompt, QUESTION_GENERATION_PROMPT)
             questions = result.get('questions', [])
             logger.info(f"生成了 {len(questions)} 个待澄清问题")
             return questions
@@ -405,7 +1196,8 @@ class TestCaseGenerator:
         """生成XMind文件"""
         # 生成输出文件名
         if not output_filename:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            t = datetime.now()
+            timestamp = f"{t.year:04d}{t.month:02d}{t.day:02d}_{t.hour:02d}{t.minute:02d}{t.second:02d}"
             output_filename = f"测试用例_{document_title}_{timestamp}.xmind"
 
         # 确保文件名以.xmind结尾
@@ -433,20 +1225,17 @@ class TestCaseGenerator:
             'modules_count': len(test_data.get('modules', []))
         }
 
-        # 统计测试用例
-        for module in test_data.get('modules', []):
-            for test_type in module.get('test_types', []):
-                for scenario in test_type.get('scenarios', []):
-                    for case in scenario.get('test_cases', []):
-                        stats['total_cases'] += 1
-
-                        confidence = case.get('confidence', 'medium')
-                        if confidence == 'high':
-                            stats['green_cases'] += 1
-                        elif confidence == 'medium':
-                            stats['yellow_cases'] += 1
-                        elif confidence == 'low':
-                            stats['red_cases'] += 1
+        # 统计测试用例：展开 模块 -> 测试类型 -> 场景 -> 用例，一次计数
+        confidence_counts = Counter(
+            case.get('confidence', 'medium')
+            for module in test_data.get('modules', [])
+            for test_type in module.get('test_types', [])
+            for scenario in test_type.get('scenarios', [])
+            for case in scenario.get('test_cases', [])
+        )
+        stats['total_cases'] = sum(confidence_counts.values())
+        for confidence, stat_key in _CONFIDENCE_STAT_KEYS.items():
+            stats[stat_key] = confidence_counts[confidence]
 
         # 计算百分比
         if stats['total_cases'] > 0:
@@ -460,19 +1249,18 @@ class TestCaseGenerator:
 
         return stats
 
-    def _analyze_images(self, images: List[Dict], max_images: int = 10) -> List[Dict]:
+    def _analyze_images(self, images: List[Dict], max_images: int = 10, image_concurrency: int = 4) -> List[Dict]:
         """
-        批量分析图片内容
+        批量分析图片内容（并发调用视觉API，结果保持图片顺序）
 
         Args:
             images: 图片列表
             max_images: 最多分析的图片数量
+            image_concurrency: 并发数
 
         Returns:
             图片描述列表
         """
-        descriptions = []
-
         # 图片分析提示词
         prompt = """请详细描述这张图片的内容,重点关注:
 
@@ -488,30 +1276,38 @@ class TestCaseGenerator:
         # 限制图片数量
         images_to_analyze = images[:max_images]
 
-        for img in images_to_analyze:
-            try:
-                self._report_progress(
-                    f"正在分析图片 #{img['index']+1}/{len(images_to_analyze)}...",
-                    25 + int((img['index'] + 1) / len(images_to_analyze) * 5)
-                )
+        total = len(images_to_analyze)
+        completed = 0
+        progress_lock = threading.Lock()
 
+        def analyze(img: Dict) -> Optional[Dict]:
+            nonlocal completed
+            try:
                 description = self.ai_service.analyze_image(
                     image_data=img['data'],
                     prompt=prompt,
                     media_type=img.get('media_type', 'image/jpeg')
                 )
-
-                descriptions.append({
+                logger.info(f"图片#{img['index']+1}分析完成: {description[:100]}...")
+                result = {
                     'index': img['index'],
                     'position': img['position'],
                     'description': description
-                })
-
-                logger.info(f"图片#{img['index']+1}分析完成: {description[:100]}...")
-
+                }
             except Exception as e:
                 logger.warning(f"图片#{img['index']+1}分析失败: {e}")
-                # 继续处理下一张图片
+                result = None
+
+            with progress_lock:
+                completed += 1
+                done = completed
+            self._report_progress(f"已分析图片 {done}/{total}...", 25 + int(done / total * 5))
+            return result
+
+        descriptions = []
+        if total:
+            with ThreadPoolExecutor(max_workers=max(1, min(image_concurrency, total))) as executor:
+                descriptions = [d for d in executor.map(analyze, images_to_analyze) if d is not None]
 
         if len(images) > max_images:
             logger.info(f"图片总数({len(images)})超过限制({max_images}),已跳过 {len(images) - max_images} 张")
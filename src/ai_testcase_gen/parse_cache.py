@@ -0,0 +1,114 @@
+"""
+文档解析结果缓存：按文件内容哈希寻址，同一文档重复生成时跳过解析和图片分析
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Optional
+
+try:
+    from .config import OUTPUT_DIR, PARSE_CACHE_ENABLED, FILE_RETENTION_DAYS
+except ImportError:
+    from config import OUTPUT_DIR, PARSE_CACHE_ENABLED, FILE_RETENTION_DAYS
+
+# orjson 解析/序列化比标准库快数倍；未安装时回退到标准库
+try:
+    import orjson
+
+    def _dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+    _loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1 << 20  # 1MB
+
+# 两次清理过期文件的最小间隔（秒）；清理要扫描整个缓存目录，不在每次写入时都做
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+class ParsedDocumentCache:
+    """磁盘缓存（每个key一个JSON文件），超过FILE_RETENTION_DAYS的条目在写入时清理（每个实例至多每小时一次）"""
+
+    def __init__(self, cache_dir: str = os.path.join(OUTPUT_DIR, ".parse_cache"),
+                 retention_days: int = FILE_RETENTION_DAYS):
+        self.cache_dir = cache_dir
+        self.retention_days = retention_days
+        self._last_prune = 0.0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def file_hash(file_path: str) -> str:
+        """计算文件内容的sha1（分块读取，不整体载入内存）"""
+        digest = hashlib.sha1()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取缓存，不存在或损坏时返回None"""
+        try:
+            with open(self._path(key), "rb") as f:
+                return _loads(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"读取解析缓存失败({key}): {e}")
+            return None
+
+    def set(self, key: str, value: Any):
+        """写入缓存（先写临时文件再替换，避免并发读到半个文件）"""
+        path = self._path(key)
+        # 临时文件名每次唯一：同一进程的多个线程同时写同一个key时互不覆盖
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_dumps(value))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"写入解析缓存失败({key}): {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        now = time.time()
+        if now - self._last_prune >= PRUNE_INTERVAL_SECONDS:
+            self._last_prune = now
+            self._prune()
+
+    def _prune(self):
+        """清理过期缓存文件"""
+        expire_before = time.time() - self.retention_days * 86400
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < expire_before:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+
+
+def create_parse_cache() -> Optional[ParsedDocumentCache]:
+    """创建解析结果缓存（未开启PARSE_CACHE时返回None）"""
+    if not PARSE_CACHE_ENABLED:
+        return None
+    try:
+        return ParsedDocumentCache()
+    except OSError as e:
+        logger.warning(f"解析缓存目录不可用({e})，不使用解析缓存")
+        return None
@@ -1,6 +1,15 @@
 """
 Prompt模板：用于AI提取测试用例
 """
+import functools
+import string
+import textwrap
+from typing import Callable
+
+try:
+    from .test_conventions import TESTING_CONVENTIONS_KB
+except ImportError:
+    from test_conventions import TESTING_CONVENTIONS_KB
 
 # ========================
 # 主提取Prompt - 智能版本（基于假设和行业惯例）
@@ -18,17 +27,7 @@ MAIN_EXTRACTION_PROMPT = """你是一位拥有10年经验的资深测试工程
 2. **需求模糊** → 基于行业惯例做合理假设，仍然生成完整可执行的用例，confidence设为"assumed"，并在assumptions字段列出假设内容
 3. **需求严重缺失** → 给出默认实现方案，confidence设为"clarify_needed"，在missing_info字段列出需要澄清的关键信息
 
-常见功能的测试惯例参考：
-- **列表查询**: 默认分页(每页10-20条)、支持排序筛选、处理空列表
-- **表单提交**: 必填校验、格式校验、唯一性校验、前后端双重验证
-- **数据ID**: 通常为数字自增或UUID，从特定值开始(如10000)
-- **删除操作**: 需要二次确认弹窗、处理关联数据、支持批量删除
-- **状态管理**: 有明确的状态流转规则、不允许非法状态转换
-- **权限控制**: 区分角色权限、未授权操作返回错误
-
-需求文档：
-标题: {title}
-内容: {content}
+""" + TESTING_CONVENTIONS_KB + """
 
 输出JSON格式(严格遵守,不要有语法错误,保持简洁):
 {{
@@ -98,6 +97,10 @@ MAIN_EXTRACTION_PROMPT = """你是一位拥有10年经验的资深测试工程
    - confidence_reason: 5字以内
    - assumptions/missing_info: 10字以内
 
+需求文档：
+标题: {title}
+内容: {content}
+
 现在开始分析并生成测试用例：
 """
 
@@ -105,14 +108,7 @@ MAIN_EXTRACTION_PROMPT = """你是一位拥有10年经验的资深测试工程
 # 置信度评估Prompt
 # ========================
 
-CONFIDENCE_EVALUATION_PROMPT = """请评估以下测试用例的置信度。
-
-# 测试用例
-标题：{case_title}
-描述：{case_description}
-
-# 对应的需求描述
-{requirement_text}
+CONFIDENCE_EVALUATION_PROMPT = """请评估文末给出的测试用例的置信度。
 
 # 评估标准
 - **high**：需求清晰，测试点明确，有具体验收标准
@@ -127,16 +123,20 @@ CONFIDENCE_EVALUATION_PROMPT = """请评估以下测试用例的置信度。
   "missing_info": ["缺失的信息1", "缺失的信息2"]
 }}
 ```
+
+# 测试用例
+标题：{case_title}
+描述：{case_description}
+
+# 对应的需求描述
+{requirement_text}
 """
 
 # ========================
 # 需求缺陷检测Prompt
 # ========================
 
-DEFECT_DETECTION_PROMPT = """请检查以下需求文档中的潜在缺陷。
-
-# 需求文档
-{content}
+DEFECT_DETECTION_PROMPT = """请检查文末给出的需求文档中的潜在缺陷。
 
 # 检测维度
 1. **模糊性**：描述不清晰、有歧义的地方
@@ -158,16 +158,16 @@ DEFECT_DETECTION_PROMPT = """请检查以下需求文档中的潜在缺陷。
   ]
 }}
 ```
+
+# 需求文档
+{content}
 """
 
 # ========================
 # 问题清单生成Prompt
 # ========================
 
-QUESTION_GENERATION_PROMPT = """请针对以下需求文档生成需要澄清的问题清单。
-
-# 需求文档
-{content}
+QUESTION_GENERATION_PROMPT = """请针对文末给出的需求文档生成需要澄清的问题清单。
 
 # 问题类型
 1. **模糊点澄清**：需要明确具体数值、范围、标准的地方
@@ -194,21 +194,16 @@ QUESTION_GENERATION_PROMPT = """请针对以下需求文档生成需要澄清的
 - **high**：阻塞性问题，不澄清无法进行测试
 - **medium**：重要但可以暂时假设的问题
 - **low**：优化性问题，不影响基本测试
+
+# 需求文档
+{content}
 """
 
 # ========================
 # 案例库匹配Prompt
 # ========================
 
-CASE_MATCHING_PROMPT = """请判断以下新需求是否与历史测试用例相似。
-
-# 新需求
-{new_requirement}
-
-# 历史测试用例
-模块：{historical_module}
-场景：{historical_scenario}
-用例：{historical_cases}
+CASE_MATCHING_PROMPT = """请判断文末给出的新需求是否与历史测试用例相似。
 
 # 判断标准
 1. 功能相似度：是否同类型功能
@@ -225,16 +220,21 @@ CASE_MATCHING_PROMPT = """请判断以下新需求是否与历史测试用例相
   "modification_suggestions": "如需修改，如何修改"
 }}
 ```
+
+# 历史测试用例
+模块：{historical_module}
+场景：{historical_scenario}
+用例：{historical_cases}
+
+# 新需求
+{new_requirement}
 """
 
 # ========================
 # XMind结构优化Prompt
 # ========================
 
-XMIND_STRUCTURE_PROMPT = """请优化以下测试用例的思维导图结构。
-
-# 当前测试用例
-{test_cases}
+XMIND_STRUCTURE_PROMPT = """请优化文末给出的测试用例的思维导图结构。
 
 # 优化目标
 1. 合理分组：相似的测试用例归为一类
@@ -242,6 +242,9 @@ XMIND_STRUCTURE_PROMPT = """请优化以下测试用例的思维导图结构。
 3. 覆盖完整：确保正常、异常、边界场景都有覆盖
 
 请输出优化后的JSON结构（与主提取Prompt相同格式）。
+
+# 当前测试用例
+{test_cases}
 """
 
 # ========================
@@ -250,11 +253,7 @@ XMIND_STRUCTURE_PROMPT = """请优化以下测试用例的思维导图结构。
 
 MODULE_IDENTIFICATION_PROMPT = """你是一位拥有10年经验的资深测试工程师。
 
-请分析以下需求文档，识别出需要测试的**功能模块**。
-
-需求文档：
-标题: {title}
-内容: {content}
+请分析文末给出的需求文档，识别出需要测试的**功能模块**。
 
 任务：
 1. 识别文档中描述的所有功能模块
@@ -280,6 +279,10 @@ MODULE_IDENTIFICATION_PROMPT = """你是一位拥有10年经验的资深测试
 4. **关键**: 所有字符串字段值中如需表示引号,请使用单引号(')或【】符号替代双引号,避免JSON解析错误
 5. 只输出JSON，确保格式正确
 
+需求文档：
+标题: {title}
+内容: {content}
+
 现在开始分析：
 """
 
@@ -287,38 +290,8 @@ MODULE_IDENTIFICATION_PROMPT = """你是一位拥有10年经验的资深测试
 # 两阶段生成：第二阶段 - 单模块测试用例生成
 # ========================
 
-SINGLE_MODULE_TESTCASE_PROMPT = """你是一位拥有10年经验的资深测试工程师。
-
-针对以下功能模块，生成完整的测试用例。
-
-模块信息：
-- 模块名称: {module_name}
-- 模块描述: {module_description}
-
-相关需求内容：
-{related_content}
-
-你的核心理念：
-- 即使需求文档不够完美，你也能基于行业惯例和测试经验，生成**可执行的、有价值的**测试用例
-- 你懂得在需求模糊时做出合理假设，并清晰标注假设内容
-
-处理策略：
-1. **需求明确** → confidence设为"clear"
-2. **需求模糊** → 基于行业惯例做合理假设，confidence设为"assumed"，在assumptions字段列出假设
-3. **需求严重缺失** → confidence设为"clarify_needed"，在missing_info字段列出需要澄清的信息
-
-常见功能的测试惯例参考：
-- **列表查询**: 默认分页(每页10-20条)、支持排序筛选、处理空列表
-- **表单提交**: 必填校验、格式校验、唯一性校验
-- **数据ID**: 通常为数字自增或UUID
-- **删除操作**: 需要二次确认弹窗、处理关联数据
-- **状态管理**: 有明确的状态流转规则
-
-输出JSON格式(只输出JSON):
-{{
-  "module_name": "{module_name}",
-  "description": "{module_description}",
-  "test_types": [
+# 单模块/多模块生成共用的测试用例JSON结构（花括号已按模板转义）
+_TEST_TYPES_SCHEMA = """  "test_types": [
     {{
       "type_name": "功能测试",
       "scenarios": [
@@ -342,7 +315,102 @@ SINGLE_MODULE_TESTCASE_PROMPT = """你是一位拥有10年经验的资深测试
       ]
     }}
   ]
-}}
+"""
+
+_JSON_QUOTE_RULE = "**关键**: 字符串字段值中如需表示引号,请使用单引号(')或【】符号替代双引号,避免JSON解析错误"
+
+# 结构化输出（工具调用）时约束模型输出的JSON Schema，与上面的JSON结构一致
+_STRING = {"type": "string"}
+
+TEST_TYPES_OUTPUT_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "required": ["type_name", "scenarios"],
+        "properties": {
+            "type_name": _STRING,
+            "scenarios": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "required": ["scenario_name", "test_cases"],
+                    "properties": {
+                        "scenario_name": _STRING,
+                        "test_cases": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "required": ["title", "test_steps", "expected_result", "confidence"],
+                                "properties": {
+                                    "title": _STRING,
+                                    "description": _STRING,
+                                    "preconditions": _STRING,
+                                    "test_steps": _STRING,
+                                    "expected_result": _STRING,
+                                    "confidence": {"type": "string", "enum": ["clear", "assumed", "clarify_needed"]},
+                                    "confidence_reason": _STRING,
+                                    "assumptions": _STRING,
+                                    "missing_info": _STRING,
+                                    "reference_practice": _STRING,
+                                },
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
+
+MODULE_TESTCASE_OUTPUT_SCHEMA = {
+    "type": "object",
+    "required": ["module_name", "test_types"],
+    "properties": {
+        "module_name": _STRING,
+        "description": _STRING,
+        "test_types": TEST_TYPES_OUTPUT_SCHEMA,
+    },
+}
+
+BATCH_MODULE_TESTCASE_OUTPUT_SCHEMA = {
+    "type": "object",
+    "required": ["modules"],
+    "properties": {
+        "modules": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["module_index", "module_name", "test_types"],
+                "properties": {
+                    "module_index": {"type": "integer"},
+                    **MODULE_TESTCASE_OUTPUT_SCHEMA["properties"],
+                },
+            },
+        },
+    },
+}
+
+# 单模块/多模块生成共用的开头（两个模板的静态前缀一致）
+MODULE_TESTCASE_PREAMBLE = """你是一位拥有10年经验的资深测试工程师。
+
+你的核心理念：
+- 即使需求文档不够完美，你也能基于行业惯例和测试经验，生成**可执行的、有价值的**测试用例
+- 你懂得在需求模糊时做出合理假设，并清晰标注假设内容
+
+处理策略：
+1. **需求明确** → confidence设为"clear"
+2. **需求模糊** → 基于行业惯例做合理假设，confidence设为"assumed"，在assumptions字段列出假设
+3. **需求严重缺失** → confidence设为"clarify_needed"，在missing_info字段列出需要澄清的信息
+
+""" + TESTING_CONVENTIONS_KB + "\n\n"
+
+SINGLE_MODULE_TESTCASE_PROMPT = MODULE_TESTCASE_PREAMBLE + """针对文末给出的功能模块，生成完整的测试用例。
+
+输出JSON格式(只输出JSON):
+{{
+  "module_name": "模块名称(与输入一致)",
+  "description": "模块描述(与输入一致)",
+""" + _TEST_TYPES_SCHEMA + """}}
 
 重要要求：
 1. 必须覆盖：正常场景、异常场景、边界场景
@@ -351,7 +419,160 @@ SINGLE_MODULE_TESTCASE_PROMPT = """你是一位拥有10年经验的资深测试
 4. 确保JSON格式正确，无尾随逗号
 5. 只输出JSON，不要有其他解释文字
 6. **严格限制**：每个场景最多3个用例，总共不超过10个测试用例
-7. **关键**: 字符串字段值中如需表示引号,请使用单引号(')或【】符号替代双引号,避免JSON解析错误
+7. """ + _JSON_QUOTE_RULE + """
+
+模块信息：
+- 模块名称: {module_name}
+- 模块描述: {module_description}
+
+相关需求内容：
+{related_content}
 
 现在开始生成测试用例：
 """
+
+# ========================
+# 两阶段生成：第二阶段 - 多模块合并生成（减少请求次数）
+# ========================
+
+BATCH_MODULE_TESTCASE_PROMPT = MODULE_TESTCASE_PREAMBLE + """针对文末给出的多个功能模块，分别生成完整的测试用例。每个模块的信息和相关需求内容位于
+<<<MODULE idx=序号>>> 与 <<<END>>> 之间。
+
+输出JSON格式(只输出JSON)，modules数组中每个模块一项，module_index与输入的idx对应:
+{{
+  "modules": [
+    {{
+      "module_index": 1,
+      "module_name": "模块名称",
+      "description": "模块描述",
+""" + textwrap.indent(_TEST_TYPES_SCHEMA, "    ") + """    }}
+  ]
+}}
+
+重要要求：
+1. 每个输入模块都必须输出一项，module_index与输入idx一致，module_name与输入一致
+2. 每个模块必须覆盖：正常场景、异常场景、边界场景
+3. 即使是"assumed"或"clarify_needed"，也要生成**完整可执行的测试用例**
+4. 保持简洁：每个字段1句话，避免冗长描述
+5. 确保JSON格式正确，无尾随逗号
+6. 只输出JSON，不要有其他解释文字
+7. **严格限制**：每个模块每个场景最多3个用例，每个模块总共不超过10个测试用例
+8. """ + _JSON_QUOTE_RULE + """
+
+{modules_block}
+
+现在开始生成测试用例：
+"""
+
+
+# 模板对应的结构化输出schema（AI服务支持时按schema约束输出）
+OUTPUT_SCHEMAS = {
+    SINGLE_MODULE_TESTCASE_PROMPT: MODULE_TESTCASE_OUTPUT_SCHEMA,
+    BATCH_MODULE_TESTCASE_PROMPT: BATCH_MODULE_TESTCASE_OUTPUT_SCHEMA,
+}
+
+
+# 合并分析Prompt（一次请求完成模块识别+缺陷检测+问题清单，文档只需预填充一次）
+COMBINED_ANALYSIS_PROMPT = """你是一位拥有10年经验的资深测试工程师。
+
+请分析文末给出的需求文档，一次完成以下三项任务：
+
+任务一：识别需要测试的**功能模块**
+1. 识别文档中描述的所有功能模块，每个模块提供简短的描述（1-2句话）
+2. 评估每个模块的测试优先级：核心业务功能为high，常规功能为medium，辅助功能为low
+3. 给出相关关键词，用于后续从需求文档中提取相关内容
+
+任务二：检查需求中的**潜在缺陷**
+检测维度：模糊性（描述不清晰、有歧义）、矛盾性（前后逻辑冲突）、完整性（缺少验收标准、边界条件、异常处理等）、合理性（业务逻辑不合理或技术上不可行）
+
+任务三：生成需要**澄清的问题清单**
+问题类型：模糊点澄清、缺失信息、矛盾确认、业务逻辑确认
+优先级：high为阻塞性问题（不澄清无法测试），medium为重要但可暂时假设，low为优化性问题
+
+输出JSON格式(只输出JSON，不要其他文字):
+{{
+  "modules": [
+    {{
+      "module_name": "模块名称",
+      "description": "简短描述",
+      "priority": "high|medium|low",
+      "related_keywords": ["关键词1", "关键词2"]
+    }}
+  ],
+  "defects": [
+    {{
+      "location": "具体位置（章节/段落）",
+      "type": "模糊/矛盾/缺失/不合理",
+      "description": "缺陷描述",
+      "severity": "high|medium|low",
+      "suggestion": "修改建议"
+    }}
+  ],
+  "questions": [
+    {{
+      "location": "需求位置",
+      "question": "具体问题",
+      "type": "模糊点澄清|缺失信息|矛盾确认|业务逻辑确认",
+      "priority": "high|medium|low",
+      "reason": "为什么需要澄清"
+    }}
+  ]
+}}
+
+要求：
+1. 模块名称要简洁明确
+2. **关键**: 所有字符串字段值中如需表示引号,请使用单引号(')或【】符号替代双引号,避免JSON解析错误
+3. 确保JSON格式正确，无尾随逗号，只输出JSON
+
+需求文档：
+标题: {title}
+内容: {content}
+
+现在开始分析：
+"""
+
+
+# ========================
+# 模板渲染
+# ========================
+
+def compile_prompt(template: str) -> Callable[..., str]:
+    """
+    把模板预编译为渲染函数：占位符只解析一次，渲染时直接拼接静态片段和变量值
+
+    与 str.format 结果相同（仅支持 {name} 形式的占位符），缺少变量时抛出 KeyError
+    """
+    # literals[i] 是第i个占位符之前的静态文本（转义的 {{ }} 会被拆成多段，这里合并）
+    literals = []
+    fields = []
+    current = []
+    for literal_text, field_name, format_spec, conversion in string.Formatter().parse(template):
+        current.append(literal_text)
+        if field_name is None:
+            continue
+        if not field_name.isidentifier() or format_spec or conversion:
+            raise ValueError(f"不支持的占位符: {{{field_name}}}")
+        literals.append("".join(current))
+        fields.append(field_name)
+        current = []
+    literals.append("".join(current))
+
+    def render(**values) -> str:
+        parts = [literals[0]]
+        for field_name, literal_text in zip(fields, literals[1:]):
+            parts.append(str(values[field_name]))
+            parts.append(literal_text)
+        return "".join(parts)
+
+    render.fields = frozenset(fields)
+    return render
+
+
+@functools.lru_cache(maxsize=None)
+def _compiled_prompt(template: str) -> Callable[..., str]:
+    return compile_prompt(template)
+
+
+def render_prompt(template: str, **values) -> str:
+    """按模板渲染prompt（等价于 template.format(**values)，模板只在首次使用时解析）"""
+    return _compiled_prompt(template)(**values)
@@ -0,0 +1,163 @@
+"""
+生成结果缓存：内容相同或几乎相同的需求文档直接复用上次的测试用例、缺陷和问题清单，跳过AI调用
+
+相似度按文档段落指纹集合的Jaccard系数计算（段落归一化空白后哈希，图片按内容哈希计入）
+"""
+import contextlib
+import hashlib
+import logging
+import os
+import re
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from .config import (
+        OUTPUT_DIR, RESULT_CACHE_ENABLED, RESULT_CACHE_SIMILARITY, RESULT_CACHE_MAX_ENTRIES, FILE_RETENTION_DAYS
+    )
+    from .parse_cache import ParsedDocumentCache
+except ImportError:
+    from config import (
+        OUTPUT_DIR, RESULT_CACHE_ENABLED, RESULT_CACHE_SIMILARITY, RESULT_CACHE_MAX_ENTRIES, FILE_RETENTION_DAYS
+    )
+    from parse_cache import ParsedDocumentCache
+
+# 索引的读-改-写需要跨进程加锁（API进程和多个RQ worker共享同一个缓存目录）
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# 结果结构或prompt有不兼容变化时递增，旧缓存自动失效
+RESULT_CACHE_VERSION = 1
+
+_INDEX_KEY = "__index__"
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=7).digest(), "big")
+
+
+def document_fingerprint(text: str, images: Iterable[Dict] = ()) -> List[int]:
+    """文档指纹：非空段落（归一化空白）与图片数据的哈希集合"""
+    fingerprint = {
+        _hash64(_WHITESPACE_RE.sub(" ", line).strip().encode("utf-8"))
+        for line in text.split("\n")
+        if line.strip()
+    }
+    fingerprint.update(_hash64(img["data"].encode("ascii")) for img in images if img.get("data"))
+    return sorted(fingerprint)
+
+
+@contextlib.contextmanager
+def _file_lock(lock_path: str):
+    """独占文件锁（同一进程的不同线程之间同样互斥）"""
+    with open(lock_path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            # 刷新修改时间，避免锁文件被当作过期缓存清理
+            os.utime(lock_path)
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class ResultCache(ParsedDocumentCache):
+    """
+    按文档相似度查找的生成结果缓存
+
+    索引（条目id、配置标签、文档指纹）单独保存，查找时只扫描索引；结果数据按条目id读取。
+    索引最多保留 max_entries 个条目，限制每次查找的扫描量
+    """
+
+    def __init__(self, cache_dir: str = os.path.join(OUTPUT_DIR, ".result_cache"),
+                 retention_days: int = FILE_RETENTION_DAYS,
+                 similarity: float = RESULT_CACHE_SIMILARITY,
+                 max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        super().__init__(cache_dir, retention_days)
+        self.similarity = similarity
+        self.max_entries = max(1, max_entries)
+        self._lock_path = os.path.join(cache_dir, "index.lock")
+
+    def lookup(self, tag: str, fingerprint: List[int]) -> Optional[Tuple[Any, float]]:
+        """
+        查找相似文档的生成结果
+
+        Args:
+            tag: 配置标签（模型、启用的功能等），只匹配标签相同的条目
+            fingerprint: document_fingerprint 的结果
+
+        Returns:
+            (缓存结果, 相似度)，未命中时返回None
+        """
+        tag = f"v{RESULT_CACHE_VERSION}|{tag}"
+        target = set(fingerprint)
+        best_id, best_score = None, 0.0
+        for entry in self.get(_INDEX_KEY) or []:
+            if entry["tag"] != tag:
+                continue
+            score = _jaccard(target, set(entry["fingerprint"]))
+            if score > best_score:
+                best_id, best_score = entry["id"], score
+
+        if best_id is None or best_score < self.similarity:
+            return None
+
+        result = self.get(f"result:{best_id}")
+        if result is None:
+            return None
+        return result, best_score
+
+    def add(self, tag: str, fingerprint: List[int], result: Any):
+        """保存生成结果并加入索引（移除结果文件已被清理的索引条目，超过条目上限时淘汰最早的条目）"""
+        entry_id = uuid.uuid4().hex
+        self.set(f"result:{entry_id}", result)
+
+        with _file_lock(self._lock_path):
+            index = [
+                entry for entry in self.get(_INDEX_KEY) or []
+                if os.path.exists(self._path(f"result:{entry['id']}"))
+            ]
+            index.append({
+                "id": entry_id,
+                "tag": f"v{RESULT_CACHE_VERSION}|{tag}",
+                "fingerprint": fingerprint,
+            })
+
+            evicted = index[:-self.max_entries]
+            self.set(_INDEX_KEY, index[-self.max_entries:])
+
+        for entry in evicted:
+            try:
+                os.remove(self._path(f"result:{entry['id']}"))
+            except OSError:
+                pass
+
+
+def create_result_cache() -> Optional[ResultCache]:
+    """创建生成结果缓存（未开启RESULT_CACHE时返回None）"""
+    if not RESULT_CACHE_ENABLED:
+        return None
+    try:
+        return ResultCache()
+    except OSError as e:
+        logger.warning(f"生成结果缓存目录不可用({e})，不使用生成结果缓存")
+        return None
@@ -0,0 +1,117 @@
+"""
+任务状态存储：基于Redis，支持多worker共享与自动过期
+"""
+import json
+import logging
+import threading
+import time
+from typing import Dict, Optional, Any
+
+try:
+    from .config import REDIS_URL, TASK_STATUS_TTL_SECONDS
+except ImportError:
+    from config import REDIS_URL, TASK_STATUS_TTL_SECONDS
+
+# orjson 解析/序列化比标准库快数倍；未安装时回退到标准库
+try:
+    import orjson
+
+    def _dumps(value: Any) -> bytes:
+        return orjson.dumps(value)
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(value: Any) -> str:
+        return json.dumps(value, ensure_ascii=False)
+
+    _loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+
+class TaskStore:
+    """
+    Redis任务状态存储（每个任务一个hash: task:{task_id}）
+
+    使用同步客户端：后台任务（RQ worker/BackgroundTasks线程）直接调用；API中调用它的端点定义为普通def，
+    由FastAPI放到线程池执行，不阻塞事件循环
+    """
+
+    def __init__(self, redis_url: str = REDIS_URL, ttl: int = TASK_STATUS_TTL_SECONDS):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("请安装 redis: pip install redis")
+
+        self.client = redis.Redis.from_url(redis_url, decode_responses=True)
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(task_id: str) -> str:
+        return f"task:{task_id}"
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态，不存在时返回None"""
+        data = self.client.hgetall(self._key(task_id))
+        if not data:
+            return None
+        return {field: _loads(value) for field, value in data.items()}
+
+    def update(self, task_id: str, /, **fields):
+        """更新任务状态字段，并刷新过期时间"""
+        key = self._key(task_id)
+        mapping = {field: _dumps(value) for field, value in fields.items()}
+        pipe = self.client.pipeline()
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+
+class InMemoryTaskStore:
+    """进程内任务状态存储（未部署Redis时的降级方案，仅支持单worker）"""
+
+    def __init__(self, ttl: int = TASK_STATUS_TTL_SECONDS):
+        self.ttl = ttl
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        self._expires_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态，不存在或已过期时返回None"""
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+            if self._expires_at[task_id] < time.time():
+                del self._tasks[task_id]
+                del self._expires_at[task_id]
+                return None
+            return dict(task)
+
+    def update(self, task_id: str, /, **fields):
+        """更新任务状态字段，并清理过期任务"""
+        now = time.time()
+        with self._lock:
+            self._tasks.setdefault(task_id, {}).update(fields)
+            self._expires_at[task_id] = now + self.ttl
+
+            expired = [tid for tid, expires_at in self._expires_at.items() if expires_at < now]
+            for tid in expired:
+                self._tasks.pop(tid, None)
+                self._expires_at.pop(tid, None)
+
+
+def create_task_store():
+    """
+    创建任务状态存储
+
+    优先使用Redis；redis未安装或无法连接时降级为进程内存储
+    """
+    try:
+        store = TaskStore()
+        store.client.ping()
+        logger.info(f"任务状态存储使用Redis: {REDIS_URL}")
+        return store
+    except Exception as e:
+        logger.warning(f"Redis不可用({e})，任务状态改为进程内存储（仅支持单worker）")
+        return InMemoryTaskStore()
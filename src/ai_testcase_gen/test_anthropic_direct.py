@@ -1,15 +1,20 @@
 """
 直接测试Anthropic SDK连接
 """
+import os
 import sys
+import time
 sys.stdout.reconfigure(encoding='utf-8')
 
 from anthropic import Anthropic
 
-# 配置
-AUTH_TOKEN = "cr_075a7d7c5c39be523c18da675acf2ac0ce6dbdd2129454370b17797eb43d20a0"
-BASE_URL = "http://47.251.110.97:3000/api"
-MODEL = "claude-sonnet-4-5-20250929"
+# 配置（从环境变量/.env读取，与 AIServiceFactory 相同）
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import ANTHROPIC_API_KEY, ANTHROPIC_AUTH_TOKEN, ANTHROPIC_BASE_URL, CLAUDE_MODEL
+
+AUTH_TOKEN = ANTHROPIC_AUTH_TOKEN or ANTHROPIC_API_KEY
+BASE_URL = ANTHROPIC_BASE_URL or "https://api.anthropic.com"
+MODEL = CLAUDE_MODEL
 
 print("="*60)
 print("测试Anthropic SDK连接")
@@ -18,23 +23,37 @@ print(f"BASE_URL: {BASE_URL}")
 print(f"MODEL: {MODEL}")
 print()
 
+if not AUTH_TOKEN:
+    print("❌ 请先设置 ANTHROPIC_AUTH_TOKEN 或 ANTHROPIC_API_KEY（环境变量或.env）")
+    sys.exit(1)
+
 try:
     client = Anthropic(
         api_key=AUTH_TOKEN,
         base_url=BASE_URL
     )
 
+    # 与生成器相同，以流式方式调用（同时验证代理是否支持SSE流式响应）
     print("发送测试请求...")
-    response = client.messages.create(
+    start = time.perf_counter()
+    first_token_at = None
+    parts = []
+    with client.messages.stream(
         model=MODEL,
         max_tokens=100,
         messages=[
             {"role": "user", "content": "Say hi in Chinese"}
         ]
-    )
+    ) as stream:
+        for text in stream.text_stream:
+            if first_token_at is None:
+                first_token_at = time.perf_counter() - start
+            parts.append(text)
 
     print("✅ 成功!")
-    print(f"响应: {response.content[0].text}")
+    print(f"响应: {''.join(parts)}")
+    if first_token_at is not None:
+        print(f"首个token耗时: {first_token_at:.2f}s，总耗时: {time.perf_counter() - start:.2f}s")
 
 except Exception as e:
     print(f"❌ 失败: {e}")
@@ -1,12 +1,23 @@
 """
 测试Claude API和可用模型
+
+探测结果按API地址缓存24小时（~/.testforge/model_registry.json），加 --force 参数重新探测
 """
+import asyncio
+import json
 import os
-from anthropic import Anthropic
+import sys
+import time
+from pathlib import Path
+
+from anthropic import AsyncAnthropic
+
+# 配置（从环境变量/.env读取，与 AIServiceFactory 相同）
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import ANTHROPIC_API_KEY, ANTHROPIC_AUTH_TOKEN, ANTHROPIC_BASE_URL
 
-# 配置
-AUTH_TOKEN = "cr_075a7d7c5c39be523c18da675acf2ac0ce6dbdd2129454370b17797eb43d20a0"
-BASE_URL = "http://47.251.110.97:3000/api"
+AUTH_TOKEN = ANTHROPIC_AUTH_TOKEN or ANTHROPIC_API_KEY
+BASE_URL = ANTHROPIC_BASE_URL or "https://api.anthropic.com"
 
 # 常见的Claude模型名称
 MODELS_TO_TEST = [
@@ -19,42 +30,104 @@ MODELS_TO_TEST = [
     "claude-instant-1.2",
 ]
 
+# 同时探测的模型数上限（避免触发服务端限流）
+MAX_CONCURRENT_PROBES = 4
+
+# 可用模型探测结果缓存
+REGISTRY_PATH = Path.home() / ".testforge" / "model_registry.json"
+REGISTRY_TTL_SECONDS = 24 * 3600
+
 print("=" * 60)
 print("测试Claude API和可用模型")
 print("=" * 60)
 print(f"API地址: {BASE_URL}")
 print()
 
-client = Anthropic(
-    api_key=AUTH_TOKEN,
-    base_url=BASE_URL
-)
+if not AUTH_TOKEN:
+    print("❌ 请先设置 ANTHROPIC_AUTH_TOKEN 或 ANTHROPIC_API_KEY（环境变量或.env）")
+    sys.exit(1)
+
+
+async def probe(client: AsyncAnthropic, semaphore: asyncio.Semaphore, model: str):
+    """探测单个模型，返回 (模型, 是否可用, 响应或错误信息)"""
+    async with semaphore:
+        try:
+            response = await client.messages.create(
+                model=model,
+                max_tokens=20,
+                messages=[
+                    {"role": "user", "content": "Say hi in Chinese"}
+                ]
+            )
+            return model, True, response.content[0].text
+        except Exception as e:
+            return model, False, str(e)
+
+
+def load_registry() -> dict:
+    """读取探测结果缓存，不存在或损坏时返回空字典"""
+    try:
+        return json.loads(REGISTRY_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def cached_working_models():
+    """当前API地址未过期的可用模型列表（探测的模型列表有变化时视为未缓存），无缓存时返回None"""
+    entry = load_registry().get(BASE_URL)
+    if not entry or entry.get("models") != MODELS_TO_TEST:
+        return None
+    if time.time() - entry.get("ts", 0) > REGISTRY_TTL_SECONDS:
+        return None
+    return entry.get("working", [])
+
+
+def save_working_models(working_models):
+    """保存当前API地址的探测结果"""
+    registry = load_registry()
+    registry[BASE_URL] = {"ts": time.time(), "models": MODELS_TO_TEST, "working": working_models}
+    try:
+        REGISTRY_PATH.parent.mkdir(parents=True, exist_ok=True)
+        REGISTRY_PATH.write_text(json.dumps(registry, ensure_ascii=False, indent=2), encoding="utf-8")
+    except OSError as e:
+        print(f"保存探测结果缓存失败: {e}")
 
-working_models = []
 
-for model in MODELS_TO_TEST:
-    print(f"Testing model: {model} ... ", end="", flush=True)
+async def probe_all():
+    """并发探测所有模型（结果按 MODELS_TO_TEST 顺序返回）"""
+    client = AsyncAnthropic(
+        api_key=AUTH_TOKEN,
+        base_url=BASE_URL
+    )
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_PROBES)
     try:
-        # 测试英文
-        response = client.messages.create(
-            model=model,
-            max_tokens=20,
-            messages=[
-                {"role": "user", "content": "Say hi in Chinese"}
-            ]
-        )
-        chinese_response = response.content[0].text
-        print(f"[OK] Available!")
-        print(f"  中文响应: {chinese_response}")
-        working_models.append(model)
-    except Exception as e:
-        error_msg = str(e)
-        if "404" in error_msg or "not_found" in error_msg:
+        return await asyncio.gather(*(probe(client, semaphore, model) for model in MODELS_TO_TEST))
+    finally:
+        await client.close()
+
+
+working_models = None if "--force" in sys.argv[1:] else cached_working_models()
+
+if working_models is not None:
+    print(f"使用缓存的探测结果（{REGISTRY_PATH}，加 --force 重新探测）")
+else:
+    working_models = []
+    for model, ok, message in asyncio.run(probe_all()):
+        print(f"Testing model: {model} ... ", end="")
+        if ok:
+            print(f"[OK] Available!")
+            print(f"  中文响应: {message}")
+            working_models.append(model)
+        elif "404" in message or "not_found" in message:
             print("[FAIL] Not supported")
-        elif "401" in error_msg or "unauthorized" in error_msg:
+        elif "401" in message or "unauthorized" in message:
             print("[FAIL] Auth error")
         else:
-            print(f"[FAIL] Error: {error_msg[:50]}")
+            print(f"[FAIL] Error: {message[:50]}")
+
+    # 认证失败等情况下所有模型都不可用，不缓存
+    if working_models:
+        save_working_models(working_models)
 
 print()
 if working_models:
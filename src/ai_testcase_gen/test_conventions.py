@@ -0,0 +1,47 @@
+"""
+常见功能的测试惯例：需求描述不完整时AI据此做合理假设
+
+TESTING_CONVENTIONS_KB 是完整的惯例清单文本，原样嵌入各用例生成prompt（所有模板共用同一段文本）
+"""
+from typing import List, NamedTuple, Tuple
+
+
+class Convention(NamedTuple):
+    """一类功能的测试惯例"""
+    name: str
+    keywords: Tuple[str, ...]
+    practice: str
+
+
+TESTING_CONVENTIONS: Tuple[Convention, ...] = (
+    Convention("列表查询", ("列表", "查询", "搜索", "分页"),
+                "默认分页(每页10-20条)、支持排序筛选、处理空列表"),
+    Convention("表单提交", ("表单", "提交", "新增", "编辑", "录入"),
+                "必填校验、格式校验、唯一性校验、前后端双重验证"),
+    Convention("数据ID", ("ID", "编号"),
+                "通常为数字自增或UUID，从特定值开始(如10000)"),
+    Convention("删除操作", ("删除", "移除"),
+                "需要二次确认弹窗、处理关联数据、支持批量删除"),
+    Convention("状态管理", ("状态", "审核", "审批", "流转"),
+                "有明确的状态流转规则、不允许非法状态转换"),
+    Convention("权限控制", ("权限", "角色", "授权"),
+                "区分角色权限、未授权操作返回错误"),
+)
+
+
+def find_relevant_conventions(text: str) -> List[Convention]:
+    """找出文本涉及的功能类型对应的测试惯例（按关键词匹配）"""
+    return [
+        convention for convention in TESTING_CONVENTIONS
+        if any(keyword in text for keyword in convention.keywords)
+    ]
+
+
+def format_conventions_for_prompt(conventions) -> str:
+    """把测试惯例格式化为prompt中的参考清单"""
+    lines = ["常见功能的测试惯例参考："]
+    lines.extend(f"- **{convention.name}**: {convention.practice}" for convention in conventions)
+    return "\n".join(lines)
+
+
+TESTING_CONVENTIONS_KB = format_conventions_for_prompt(TESTING_CONVENTIONS)
@@ -3,7 +3,6 @@
 """
 import sys
 import os
-import glob
 
 # 设置UTF-8输出
 sys.stdout.reconfigure(encoding='utf-8')
@@ -19,19 +18,24 @@ upload_dirs = [
     r"D:\Python_file\tool_project\testforge\src\ai_testcase_gen\uploads",
 ]
 
+DOC_EXTENSIONS = (".docx", ".pdf", ".doc")
+
+# (修改时间, 路径)；DirEntry.stat() 结果会被缓存，每个文件只需一次stat
 docs = []
 for upload_dir in upload_dirs:
-    if os.path.exists(upload_dir):
-        # 查找.docx和.pdf文件
-        for pattern in ["*.docx", "*.pdf", "*.doc"]:
-            for file_path in glob.glob(os.path.join(upload_dir, pattern)):
-                # 过滤临时文件和空文件
-                filename = os.path.basename(file_path)
-                if filename.startswith("~$"):  # Word临时文件
-                    continue
-                if os.path.getsize(file_path) == 0:  # 空文件
-                    continue
-                docs.append(file_path)
+    if not os.path.isdir(upload_dir):
+        continue
+    with os.scandir(upload_dir) as entries:
+        for entry in entries:
+            # 过滤临时文件、隐藏文件和空文件
+            if entry.name.startswith(("~$", ".")):  # ~$ 为Word临时文件
+                continue
+            if not entry.name.lower().endswith(DOC_EXTENSIONS) or not entry.is_file():
+                continue
+            stat = entry.stat()
+            if stat.st_size == 0:  # 空文件
+                continue
+            docs.append((stat.st_mtime, entry.path))
 
 if not docs:
     print(f"Error: No .docx files found in:")
@@ -40,7 +44,7 @@ if not docs:
     sys.exit(1)
 
 # 使用最新的文档
-doc_path = max(docs, key=os.path.getmtime)
+doc_path = max(docs)[1]
 
 # 确保路径使用正确的编码
 if isinstance(doc_path, bytes):
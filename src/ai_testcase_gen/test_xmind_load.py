@@ -4,8 +4,16 @@
 import sys
 sys.stdout.reconfigure(encoding='utf-8')
 
-import xmind
 import os
+import re
+import zipfile
+
+from lxml import etree
+
+# XMind 8 content.xml 的默认命名空间
+CONTENT_NS = "{urn:xmind:xmap:xmlns:content:2.0}"
+# 测试用例节点的emoji标记 ✅ ⚠ ❌（⚠ 后有无变体选择符U+FE0F都能匹配）
+CASE_MARKER_RE = re.compile("[\u2705\u26a0\u274c]")
 
 # 获取最新的XMind文件
 outputs_dir = r"D:\Python_file\tool_project\testforge\src\ai_testcase_gen\outputs"
@@ -19,45 +27,25 @@ if xmind_files:
     print()
 
     try:
-        print("正在加载XMind文件...")
-        wb = xmind.load(latest_file)
-        print("✅ 加载成功!")
-        print()
-
-        sheet = wb.getPrimarySheet()
-        root = sheet.getRootTopic()
-
-        print(f"根主题: {root.getTitle()}")
-
-        topics = root.getSubTopics()
-        print(f"模块数量: {len(topics)}")
-        print()
-
-        # 统计测试用例数量
-        def count_cases(topic, level=0):
-            count = 0
-            indent = "  " * level
-            title = topic.getTitle()
-
-            # 检查是否是测试用例节点（带emoji标记）
-            if any(emoji in title for emoji in ["✅", "⚠️", "❌"]):
-                count = 1
-                print(f"{indent}- {title[:50]}...")
+        print("正在解析XMind文件...")
+        print("前5个测试用例:")
 
-            # 递归统计子节点
-            for sub in topic.getSubTopics():
-                count += count_cases(sub, level + 1)
+        # 流式解析content.xml，逐个处理topic节点后立即释放，不构建整棵树
+        case_count = 0
+        with zipfile.ZipFile(latest_file) as z, z.open("content.xml") as f:
+            for _, element in etree.iterparse(f, events=("end",), tag=f"{CONTENT_NS}topic"):
+                title = element.findtext(f"{CONTENT_NS}title") or ""
 
-            return count
+                # 检查是否是测试用例节点（带emoji标记）
+                if CASE_MARKER_RE.search(title):
+                    case_count += 1
+                    if case_count <= 5:
+                        print(f"- {title[:50]}...")
 
-        print("前5个测试用例:")
-        case_count = 0
-        for module in topics:
-            if case_count >= 5:
-                break
-            case_count += count_cases(module)
+                element.clear()
 
         print()
+        print(f"测试用例数量: {case_count}")
         print(f"✅ XMind文件完全正常，可以被Python加载和解析！")
 
     except Exception as e:
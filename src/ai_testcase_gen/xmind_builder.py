@@ -2,12 +2,76 @@
 XMind文件生成器
 """
 import os
+import itertools
 import logging
-from typing import Dict, List, Optional
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
+# 兼容旧版本的 confidence 值
+_CONF_REMAP = {
+    "high": "clear",
+    "medium": "assumed",
+    "low": "clarify_needed",
+}
+
+# 置信度标记：(图标, 标签)
+_CONF_META = {
+    "clear": ("✅", "需求明确"),           # 绿色 - 需求明确
+    "assumed": ("💡", "基于假设"),         # 蓝色 - 基于假设
+    "clarify_needed": ("❓", "建议澄清"),  # 黄色 - 需要澄清
+}
+_DEFAULT_META = ("📝", "待确认")
+
+# _fix_xmind_file 补充的 meta.xml 和 META-INF/manifest.xml 模板
+_META_TEMPLATE = '''<?xml version="1.0" encoding="UTF-8"?>
+<meta xmlns="urn:xmind:xmap:xmlns:meta:2.0" version="2.0">
+    <Author>
+        <Name>TestForge AI</Name>
+    </Author>
+    <Create>
+        <Time>{time}</Time>
+    </Create>
+    <Creator>
+        <Name>TestForge</Name>
+        <Version>1.0</Version>
+    </Creator>
+</meta>'''
+
+_MANIFEST_TEMPLATE = '''<?xml version="1.0" encoding="UTF-8"?>
+<manifest xmlns="urn:xmind:xmap:xmlns:manifest:1.0">
+{entries}
+</manifest>'''
+
+_MANIFEST_ENTRY_TEMPLATE = '    <file-entry full-path="{path}" media-type="{media_type}"/>'
+
+# manifest 中各扩展名对应的 media-type（其他扩展名为 application/octet-stream）
+_MEDIA_TYPES = {
+    ".xml": "text/xml",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+}
+
+
+def _bucket_by_level(items: List[Dict], key: str) -> Dict[str, List[Dict]]:
+    """一次遍历按 high/medium/low 分组（缺失或无法识别的级别归入low）"""
+    buckets = {"high": [], "medium": [], "low": []}
+    low = buckets["low"]
+    for item in items:
+        buckets.get(item.get(key), low).append(item)
+    return buckets
+
+
+def _normalize_listfield(value) -> List[str]:
+    """把字符串（分号分隔）或数组形式的字段统一为列表"""
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(';') if item.strip()]
+    return list(value or [])
+
 
 class XMindBuilder:
     """XMind思维导图构建器"""
@@ -37,8 +101,10 @@ class XMindBuilder:
         Returns:
             生成的XMind文件路径
         """
+        xmind = self.xmind
+
         # 创建工作簿（直接使用输出路径，如果不存在会自动创建新的）
-        workbook = self.xmind.load(output_path)
+        workbook = xmind.load(output_path)
         sheet = workbook.getPrimarySheet()
 
         # 设置根节点
@@ -47,8 +113,9 @@ class XMindBuilder:
 
         # 构建模块节点
         modules = test_data.get("modules", [])
+        add_module = self._add_module
         for module in modules:
-            self._add_module(root_topic, module)
+            add_module(root_topic, module)
 
         # 添加问题清单（作为独立的一级节点）
         questions = test_data.get("questions", [])
@@ -61,14 +128,32 @@ class XMindBuilder:
             self._add_defects_node(root_topic, defects)
 
         # 保存文件
-        self.xmind.save(workbook, output_path)
-        logger.info(f"XMind文件已生成: {output_path}")
+        xmind.save(workbook, output_path)
+        logger.info("XMind文件已生成: %s", output_path)
 
         # 修复XMind文件（添加缺失的meta.xml和manifest.xml）
         self._fix_xmind_file(output_path)
 
         return output_path
 
+    def build_many(self, items: Iterable[Tuple], max_workers: int = 8) -> List[str]:
+        """
+        批量构建XMind文件（线程池并行，保存和修复zip的压缩/写盘可以重叠）
+
+        Args:
+            items: (test_data, output_path) 或 (test_data, output_path, title) 元组
+            max_workers: 最大并行数
+
+        Returns:
+            生成的XMind文件路径（与items顺序一致）
+        """
+        items = list(items)
+        if not items:
+            return []
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as executor:
+            return list(executor.map(lambda item: self.build(*item), items))
+
     def _get_template_path(self) -> Optional[str]:
         """获取模板路径（如果有的话）"""
         # 如果有预定义模板，可以在这里返回路径
@@ -88,8 +173,9 @@ class XMindBuilder:
 
         # 添加测试类型
         test_types = module.get("test_types", [])
+        add_test_type = self._add_test_type
         for test_type in test_types:
-            self._add_test_type(module_topic, test_type)
+            add_test_type(module_topic, test_type)
 
     def _add_test_type(self, parent_topic, test_type: Dict):
         """添加测试类型节点"""
@@ -98,8 +184,9 @@ class XMindBuilder:
 
         # 添加测试场景
         scenarios = test_type.get("scenarios", [])
+        add_scenario = self._add_scenario
         for scenario in scenarios:
-            self._add_scenario(type_topic, scenario)
+            add_scenario(type_topic, scenario)
 
     def _add_scenario(self, parent_topic, scenario: Dict):
         """添加测试场景节点"""
@@ -108,8 +195,9 @@ class XMindBuilder:
 
         # 添加测试用例
         test_cases = scenario.get("test_cases", [])
+        add_test_case = self._add_test_case
         for test_case in test_cases:
-            self._add_test_case(scenario_topic, test_case)
+            add_test_case(scenario_topic, test_case)
 
     def _add_test_case(self, parent_topic, test_case: Dict):
         """添加测试用例节点 - 新版：支持 clear/assumed/clarify_needed"""
@@ -117,35 +205,17 @@ class XMindBuilder:
 
         # 获取置信度（兼容旧版和新版）
         confidence = test_case.get("confidence", "medium")
+        confidence = _CONF_REMAP.get(confidence, confidence)
 
-        # 兼容旧版本的 confidence 值
-        confidence_map = {
-            "high": "clear",
-            "medium": "assumed",
-            "low": "clarify_needed"
-        }
-        confidence = confidence_map.get(confidence, confidence)
+        # 只有assumed/clarify_needed用例才用到假设/缺失信息，统一为列表（AI可能返回分号分隔的字符串或数组）
+        if confidence == "assumed":
+            test_case = {**test_case, "assumptions": _normalize_listfield(test_case.get("assumptions"))}
+        elif confidence == "clarify_needed":
+            test_case = {**test_case, "missing_info": _normalize_listfield(test_case.get("missing_info"))}
 
-        # 设置标题
+        # 设置标题和置信度标记
         title = test_case.get("title", "未命名用例")
-
-        # 新的置信度标记系统
-        if confidence == "clear":
-            # 绿色 - 需求明确
-            icon = "✅"
-            label = "需求明确"
-        elif confidence == "assumed":
-            # 蓝色 - 基于假设
-            icon = "💡"
-            label = "基于假设"
-        elif confidence == "clarify_needed":
-            # 黄色 - 需要澄清
-            icon = "❓"
-            label = "建议澄清"
-        else:
-            # 默认
-            icon = "📝"
-            label = "待确认"
+        icon, label = _CONF_META.get(confidence, _DEFAULT_META)
 
         case_topic.setTitle(f"{icon} {title}")
 
@@ -157,41 +227,23 @@ class XMindBuilder:
         # 添加标签
         case_topic.addLabel(label)
 
-        # 如果有假设，添加假设节点（支持字符串或数组）
-        assumptions = test_case.get("assumptions", [])
-        if assumptions and confidence == "assumed":
-            assumptions_topic = case_topic.addSubTopic()
-            assumptions_topic.setTitle("📌 测试假设")
-            if isinstance(assumptions, str):
-                # 字符串格式，按分号分隔
-                for assumption in assumptions.split(';'):
-                    assumption = assumption.strip()
-                    if assumption:
-                        assumption_item = assumptions_topic.addSubTopic()
-                        assumption_item.setTitle(f"▸ {assumption}")
-            else:
-                # 数组格式
+        # 添加假设节点（基于假设）或缺失信息节点（需要澄清）
+        if confidence == "assumed":
+            assumptions = test_case["assumptions"]
+            if assumptions:
+                assumptions_topic = case_topic.addSubTopic()
+                assumptions_topic.setTitle("📌 测试假设")
+                add_item = assumptions_topic.addSubTopic
                 for assumption in assumptions:
-                    assumption_item = assumptions_topic.addSubTopic()
-                    assumption_item.setTitle(f"▸ {assumption}")
-
-        # 如果需要澄清，添加缺失信息节点（支持字符串或数组）
-        missing_info = test_case.get("missing_info", [])
-        if missing_info and confidence == "clarify_needed":
-            missing_topic = case_topic.addSubTopic()
-            missing_topic.setTitle("❗ 需要澄清")
-            if isinstance(missing_info, str):
-                # 字符串格式，按分号分隔
-                for info in missing_info.split(';'):
-                    info = info.strip()
-                    if info:
-                        info_item = missing_topic.addSubTopic()
-                        info_item.setTitle(f"? {info}")
-            else:
-                # 数组格式
+                    add_item().setTitle(f"▸ {assumption}")
+        elif confidence == "clarify_needed":
+            missing_info = test_case["missing_info"]
+            if missing_info:
+                missing_topic = case_topic.addSubTopic()
+                missing_topic.setTitle("❗ 需要澄清")
+                add_item = missing_topic.addSubTopic
                 for info in missing_info:
-                    info_item = missing_topic.addSubTopic()
-                    info_item.setTitle(f"? {info}")
+                    add_item().setTitle(f"? {info}")
 
     def _get_color_by_confidence(self, confidence: str) -> Optional[str]:
         """根据置信度获取颜色"""
@@ -239,143 +291,153 @@ class XMindBuilder:
 
     def _build_case_notes_v2(self, test_case: Dict, confidence: str) -> str:
         """构建测试用例备注信息（新版，支持假设和缺失信息）"""
+        # 各段逐个写入同一个列表缓冲，最后只拼接一次；段与段之间用空行分隔
         notes_parts = []
+        write = notes_parts.append
+
+        def section(header: str):
+            if notes_parts:
+                write("\n\n")
+            write(header)
 
         # 描述
         description = test_case.get("description")
         if description:
-            notes_parts.append(f"📝 描述：{description}")
+            section(f"📝 描述：{description}")
 
         # 前置条件
         preconditions = test_case.get("preconditions")
         if preconditions:
-            notes_parts.append(f"\n🔧 前置条件：{preconditions}")
+            section(f"🔧 前置条件：{preconditions}")
 
         # 测试步骤（支持字符串或数组）
         test_steps = test_case.get("test_steps", [])
         if test_steps:
             if isinstance(test_steps, str):
-                notes_parts.append(f"\n👣 测试步骤：{test_steps}")
+                section(f"👣 测试步骤：{test_steps}")
             else:
-                steps_text = "\n".join([f"  {i+1}. {step}" for i, step in enumerate(test_steps)])
-                notes_parts.append(f"\n👣 测试步骤：\n{steps_text}")
+                section("👣 测试步骤：")
+                for i, step in enumerate(test_steps, 1):
+                    write(f"\n  {i}. {step}")
 
         # 预期结果
         expected_result = test_case.get("expected_result")
         if expected_result:
-            notes_parts.append(f"\n✔️ 预期结果：{expected_result}")
+            section(f"✔️ 预期结果：{expected_result}")
 
         # 置信度说明
         confidence_reason = test_case.get("confidence_reason")
         if confidence_reason:
-            notes_parts.append(f"\n💭 置信度说明：{confidence_reason}")
+            section(f"💭 置信度说明：{confidence_reason}")
 
-        # 如果基于假设，显示假设内容（支持字符串或数组）
+        # 如果基于假设，显示假设内容（assumptions已统一为列表）
         if confidence == "assumed":
-            assumptions = test_case.get("assumptions", [])
+            assumptions = test_case.get("assumptions")
             if assumptions:
-                if isinstance(assumptions, str):
-                    notes_parts.append(f"\n💡 测试假设：{assumptions}")
-                else:
-                    assumptions_text = "\n".join([f"  ▸ {a}" for a in assumptions])
-                    notes_parts.append(f"\n💡 测试假设：\n{assumptions_text}")
+                section("💡 测试假设：")
+                for assumption in assumptions:
+                    write(f"\n  ▸ {assumption}")
 
-        # 如果需要澄清，显示缺失信息（支持字符串或数组）
+        # 如果需要澄清，显示缺失信息（missing_info已统一为列表）
         if confidence == "clarify_needed":
-            missing_info = test_case.get("missing_info", [])
+            missing_info = test_case.get("missing_info")
             if missing_info:
-                if isinstance(missing_info, str):
-                    notes_parts.append(f"\n❓ 需要澄清：{missing_info}")
-                else:
-                    missing_text = "\n".join([f"  ? {m}" for m in missing_info])
-                    notes_parts.append(f"\n❓ 需要澄清：\n{missing_text}")
+                section("❓ 需要澄清：")
+                for info in missing_info:
+                    write(f"\n  ? {info}")
 
         # 参考的行业惯例
         reference_practice = test_case.get("reference_practice")
         if reference_practice:
-            notes_parts.append(f"\n📚 参考惯例：{reference_practice}")
+            section(f"📚 参考惯例：{reference_practice}")
 
-        return "\n".join(notes_parts)
+        return "".join(notes_parts)
 
     def _add_questions_node(self, parent_topic, questions: List[Dict]):
         """添加问题清单节点"""
         questions_topic = parent_topic.addSubTopic()
         questions_topic.setTitle("🤔 问题清单（需澄清）")
 
+        add_question_item = self._add_question_item
+
         # 按优先级分组
-        high_priority = [q for q in questions if q.get("priority") == "high"]
-        medium_priority = [q for q in questions if q.get("priority") == "medium"]
-        low_priority = [q for q in questions if q.get("priority") == "low"]
+        buckets = _bucket_by_level(questions, "priority")
+        high_priority = buckets["high"]
+        medium_priority = buckets["medium"]
+        low_priority = buckets["low"]
 
         # 添加高优先级问题
         if high_priority:
             high_topic = questions_topic.addSubTopic()
             high_topic.setTitle("🔴 高优先级（阻塞性）")
             for q in high_priority:
-                self._add_question_item(high_topic, q)
+                add_question_item(high_topic, q)
 
         # 添加中优先级问题
         if medium_priority:
             medium_topic = questions_topic.addSubTopic()
             medium_topic.setTitle("🟡 中优先级（重要）")
             for q in medium_priority:
-                self._add_question_item(medium_topic, q)
+                add_question_item(medium_topic, q)
 
         # 添加低优先级问题
         if low_priority:
             low_topic = questions_topic.addSubTopic()
             low_topic.setTitle("🟢 低优先级（优化）")
             for q in low_priority:
-                self._add_question_item(low_topic, q)
+                add_question_item(low_topic, q)
 
     def _add_question_item(self, parent_topic, question: Dict):
         """添加单个问题项"""
         q_topic = parent_topic.addSubTopic()
         q_topic.setTitle(question.get("question", ""))
 
-        # 添加详细信息
-        notes = []
+        # 添加详细信息（两项都没有时不创建备注）
         location = question.get("location")
+        reason = question.get("reason")
+        if not (location or reason):
+            return
+
+        notes = []
         if location:
             notes.append(f"位置：{location}")
-
-        reason = question.get("reason")
         if reason:
             notes.append(f"原因：{reason}")
-
-        if notes:
-            q_topic.setPlainNotes("\n".join(notes))
+        q_topic.setPlainNotes("\n".join(notes))
 
     def _add_defects_node(self, parent_topic, defects: List[Dict]):
         """添加需求缺陷节点"""
         defects_topic = parent_topic.addSubTopic()
         defects_topic.setTitle("🐛 需求缺陷")
 
+        add_defect_item = self._add_defect_item
+
         # 按严重程度分组
-        high_severity = [d for d in defects if d.get("severity") == "high"]
-        medium_severity = [d for d in defects if d.get("severity") == "medium"]
-        low_severity = [d for d in defects if d.get("severity") == "low"]
+        buckets = _bucket_by_level(defects, "severity")
+        high_severity = buckets["high"]
+        medium_severity = buckets["medium"]
+        low_severity = buckets["low"]
 
         # 添加高严重度缺陷
         if high_severity:
             high_topic = defects_topic.addSubTopic()
             high_topic.setTitle("🔴 高严重度")
             for d in high_severity:
-                self._add_defect_item(high_topic, d)
+                add_defect_item(high_topic, d)
 
         # 添加中严重度缺陷
         if medium_severity:
             medium_topic = defects_topic.addSubTopic()
             medium_topic.setTitle("🟡 中严重度")
             for d in medium_severity:
-                self._add_defect_item(medium_topic, d)
+                add_defect_item(medium_topic, d)
 
         # 添加低严重度缺陷
         if low_severity:
             low_topic = defects_topic.addSubTopic()
             low_topic.setTitle("🟢 低严重度")
             for d in low_severity:
-                self._add_defect_item(low_topic, d)
+                add_defect_item(low_topic, d)
 
     def _add_defect_item(self, parent_topic, defect: Dict):
         """添加单个缺陷项"""
@@ -385,18 +447,18 @@ class XMindBuilder:
         description = defect.get("description", "")
         d_topic.setTitle(f"[{defect_type}] {description}")
 
-        # 添加详细信息
-        notes = []
+        # 添加详细信息（两项都没有时不创建备注）
         location = defect.get("location")
+        suggestion = defect.get("suggestion")
+        if not (location or suggestion):
+            return
+
+        notes = []
         if location:
             notes.append(f"位置：{location}")
-
-        suggestion = defect.get("suggestion")
         if suggestion:
             notes.append(f"修改建议：{suggestion}")
-
-        if notes:
-            d_topic.setPlainNotes("\n".join(notes))
+        d_topic.setPlainNotes("\n".join(notes))
 
     def _fix_xmind_file(self, xmind_path: str):
         """
@@ -406,70 +468,40 @@ class XMindBuilder:
             xmind_path: XMind文件路径
         """
         import zipfile
-        import re
 
-        # 读取现有文件
-        with zipfile.ZipFile(xmind_path, 'r') as zin:
-            existing_files = zin.namelist()
+        # 追加模式：只写入缺失的条目，不重写已有条目
+        with zipfile.ZipFile(xmind_path, 'a', zipfile.ZIP_DEFLATED) as zf:
+            existing_files = zf.namelist()
 
             # 检查是否需要修复
             if 'meta.xml' in existing_files and 'META-INF/manifest.xml' in existing_files:
                 return  # 文件完整，无需修复
 
-            # 读取content.xml
-            content_xml = zin.read('content.xml').decode('utf-8')
-
-        # 创建临时文件
-        temp_path = xmind_path + ".tmp"
-
-        # 创建新的zip文件，包含所有原始文件 + 缺失文件
-        with zipfile.ZipFile(xmind_path, 'r') as zin:
-            with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as zout:
-                # 复制所有现有文件
-                for item in zin.namelist():
-                    zout.writestr(item, zin.read(item))
-
-                # 添加meta.xml（如果缺失）
-                if 'meta.xml' not in existing_files:
-                    from datetime import datetime
-                    meta_xml = f'''<?xml version="1.0" encoding="UTF-8"?>
-<meta xmlns="urn:xmind:xmap:xmlns:meta:2.0" version="2.0">
-    <Author>
-        <Name>TestForge AI</Name>
-    </Author>
-    <Create>
-        <Time>{datetime.now().strftime("%Y-%m-%dT%H:%M:%S")}Z</Time>
-    </Create>
-    <Creator>
-        <Name>TestForge</Name>
-        <Version>1.0</Version>
-    </Creator>
-</meta>'''
-                    zout.writestr('meta.xml', meta_xml.encode('utf-8'))
-
-                # 添加manifest.xml（如果缺失）
-                if 'META-INF/manifest.xml' not in existing_files:
-                    # 获取所有文件列表
-                    all_files = existing_files.copy()
-                    if 'meta.xml' not in all_files:
-                        all_files.append('meta.xml')
-
-                    # 生成manifest
-                    file_entries = []
-                    for f in all_files:
-                        if f != 'META-INF/manifest.xml':
-                            media_type = 'text/xml' if f.endswith('.xml') else 'application/octet-stream'
-                            file_entries.append(f'    <file-entry full-path="{f}" media-type="{media_type}"/>')
-
-                    manifest_xml = f'''<?xml version="1.0" encoding="UTF-8"?>
-<manifest xmlns="urn:xmind:xmap:xmlns:manifest:1.0">
-{chr(10).join(file_entries)}
-</manifest>'''
-                    zout.writestr('META-INF/manifest.xml', manifest_xml.encode('utf-8'))
-
-        # 替换原文件
-        os.replace(temp_path, xmind_path)
-        logger.debug(f"XMind文件已修复: {xmind_path}")
+            # 添加meta.xml（如果缺失）
+            if 'meta.xml' not in existing_files:
+                # 带Z后缀的时间必须是UTC时间
+                created = datetime.now(timezone.utc).replace(tzinfo=None)
+                meta_xml = _META_TEMPLATE.format(time=created.isoformat(timespec="seconds") + "Z")
+                zf.writestr('meta.xml', meta_xml.encode('utf-8'))
+
+            # 添加manifest.xml（如果缺失）
+            if 'META-INF/manifest.xml' not in existing_files:
+                # 所有文件：现有文件 + 本次补充的meta.xml
+                added_files = ('meta.xml',) if 'meta.xml' not in existing_files else ()
+                all_files = itertools.chain(existing_files, added_files)
+
+                # 生成manifest
+                file_entries = "\n".join(
+                    _MANIFEST_ENTRY_TEMPLATE.format(
+                        path=f,
+                        media_type=_MEDIA_TYPES.get(os.path.splitext(f)[1].lower(), "application/octet-stream"),
+                    )
+                    for f in all_files if f != 'META-INF/manifest.xml'
+                )
+                manifest_xml = _MANIFEST_TEMPLATE.format(entries=file_entries)
+                zf.writestr('META-INF/manifest.xml', manifest_xml.encode('utf-8'))
+
+        logger.debug("XMind文件已修复: %s", xmind_path)
 
 
 # 使用示例
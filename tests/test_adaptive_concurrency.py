@@ -0,0 +1,76 @@
+"""
+AI请求并发数自适应控制测试
+"""
+
+import pytest
+from src.ai_testcase_gen import generator
+from src.ai_testcase_gen.generator import _AdaptiveConcurrency
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手动推进的时钟，替换 time.monotonic"""
+    now = [0.0]
+    monkeypatch.setattr(generator.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _run(control, clock, output_size, seconds):
+    """顺序执行一个请求：占用名额、耗时seconds、输出output_size字节"""
+    control.acquire()
+    clock[0] += seconds
+    control.release(output_size)
+
+
+def test_limit_rises_while_throughput_improves(clock):
+    """吞吐量上升时继续提高并发上限，且不超过最大值"""
+    control = _AdaptiveConcurrency(initial=2, maximum=4, window=2)
+
+    # 第一个窗口：200字节/2秒，没有可比较的历史数据，按初始方向上调
+    _run(control, clock, 100, 1.0)
+    _run(control, clock, 100, 1.0)
+    assert control.limit == 3
+
+    # 第二个窗口：200字节/1秒，吞吐量上升，继续上调
+    _run(control, clock, 100, 0.5)
+    _run(control, clock, 100, 0.5)
+    assert control.limit == 4
+
+    # 已到最大值
+    _run(control, clock, 100, 0.25)
+    _run(control, clock, 100, 0.25)
+    assert control.limit == 4
+
+
+def test_limit_reverses_when_throughput_drops(clock):
+    """吞吐量下降时反向调整"""
+    control = _AdaptiveConcurrency(initial=2, maximum=8, window=2)
+
+    _run(control, clock, 100, 0.5)
+    _run(control, clock, 100, 0.5)
+    assert control.limit == 3
+
+    _run(control, clock, 100, 2.0)
+    _run(control, clock, 100, 2.0)
+    assert control.limit == 2
+
+
+def test_failure_lowers_limit_immediately(clock):
+    """请求失败立即降低并发上限，最低为1"""
+    control = _AdaptiveConcurrency(initial=3, maximum=8, window=5)
+
+    control.acquire()
+    control.release(failed=True)
+    assert control.limit == 2
+
+    control.acquire()
+    control.release(failed=True)
+    control.acquire()
+    control.release(failed=True)
+    assert control.limit == 1
+
+
+def test_initial_limit_clamped_to_maximum():
+    """初始并发数不超过最大值，且至少为1"""
+    assert _AdaptiveConcurrency(initial=10, maximum=4).limit == 4
+    assert _AdaptiveConcurrency(initial=0, maximum=4).limit == 1
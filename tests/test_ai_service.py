@@ -0,0 +1,19 @@
+"""
+AI服务JSON清理与解析测试
+"""
+
+import json
+
+from src.ai_testcase_gen.ai_service import _JSONResponseMixin, _cleanup_json
+
+
+def test_chinese_quotes_inside_values_are_kept():
+    """字符串值中的中文引号原样保留，JSON仍可解析"""
+    text = '{"title": "点击“提交”按钮", "note": "‘可选’"}'
+    assert _cleanup_json(text) == text
+    assert _JSONResponseMixin()._parse_json_response(text) == json.loads(text)
+
+
+def test_control_chars_removed():
+    """删除控制字符，保留制表符和换行；控制字符不影响多余逗号的修复"""
+    assert _cleanup_json('{"a": "x\x00y\x1f",\n\t"b": [1,\x0b]}') == '{"a": "xy",\n\t"b": [1]}'
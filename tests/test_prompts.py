@@ -0,0 +1,47 @@
+"""
+Prompt模板渲染测试
+"""
+
+import pytest
+from src.ai_testcase_gen.prompts import (
+    MODULE_IDENTIFICATION_PROMPT, compile_prompt, render_prompt
+)
+
+
+def test_render_matches_str_format():
+    """渲染结果与 str.format 相同"""
+    values = {"title": "用户管理", "content": "支持新增、编辑和删除用户"}
+    assert render_prompt(MODULE_IDENTIFICATION_PROMPT, **values) == MODULE_IDENTIFICATION_PROMPT.format(**values)
+
+
+def test_escaped_braces_are_rendered_as_literals():
+    """转义的 {{ }} 渲染为单个花括号"""
+    template = '{{"name": "{name}", "items": [{{}}]}} {{{{x}}}}'
+    assert render_prompt(template, name="登录") == template.format(name="登录")
+    assert render_prompt(template, name="登录") == '{"name": "登录", "items": [{}]} {{x}}'
+
+
+def test_values_with_braces_are_not_reformatted():
+    """变量值中的花括号原样保留"""
+    assert render_prompt("内容：{content}", content='{"a": "{b}"}') == '内容：{"a": "{b}"}'
+
+
+def test_compile_prompt_fields():
+    """预编译结果记录模板中的占位符"""
+    render = compile_prompt("{title}：{content}，{title}")
+    assert render.fields == frozenset({"title", "content"})
+    assert render(title="T", content="C") == "T：C，T"
+
+
+def test_missing_value_raises_key_error():
+    """缺少变量时抛出 KeyError"""
+    with pytest.raises(KeyError):
+        render_prompt("{title}{content}", title="T")
+
+
+def test_unsupported_placeholder_rejected():
+    """不支持带格式说明或属性访问的占位符"""
+    with pytest.raises(ValueError):
+        compile_prompt("{count:>5}")
+    with pytest.raises(ValueError):
+        compile_prompt("{doc.title}")
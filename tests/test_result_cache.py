@@ -0,0 +1,62 @@
+"""
+生成结果缓存测试
+"""
+
+from src.ai_testcase_gen.result_cache import ResultCache, document_fingerprint
+
+
+def _document(paragraphs):
+    return "\n".join(paragraphs)
+
+
+BASE_PARAGRAPHS = [f"需求段落{i}" for i in range(10)]
+
+
+def test_fingerprint_ignores_whitespace_and_empty_lines():
+    """段落指纹忽略空行和空白差异"""
+    assert document_fingerprint("登录  功能\n\n注册") == document_fingerprint("登录 功能\n注册\n")
+    assert document_fingerprint("登录") != document_fingerprint("注册")
+
+
+def test_fingerprint_includes_images():
+    """图片按内容计入指纹"""
+    text = "登录"
+    assert document_fingerprint(text, [{"data": "aGVsbG8="}]) != document_fingerprint(text)
+
+
+def test_lookup_similarity_cutoff(tmp_path):
+    """相似度不低于阈值时命中，低于阈值时未命中"""
+    cache = ResultCache(str(tmp_path), similarity=0.8)
+    cache.add("model", document_fingerprint(_document(BASE_PARAGRAPHS)), {"modules": ["m"]})
+
+    # 改动1段：交集9，并集11，相似度约0.82
+    one_changed = BASE_PARAGRAPHS[:-1] + ["新的段落"]
+    hit = cache.lookup("model", document_fingerprint(_document(one_changed)))
+    assert hit is not None
+    result, similarity = hit
+    assert result == {"modules": ["m"]}
+    assert 0.8 <= similarity < 1.0
+
+    # 改动2段：交集8，并集12，相似度约0.67
+    two_changed = BASE_PARAGRAPHS[:-2] + ["新的段落1", "新的段落2"]
+    assert cache.lookup("model", document_fingerprint(_document(two_changed))) is None
+
+
+def test_lookup_requires_same_tag(tmp_path):
+    """配置标签不同时不复用结果"""
+    cache = ResultCache(str(tmp_path), similarity=0.8)
+    fingerprint = document_fingerprint(_document(BASE_PARAGRAPHS))
+    cache.add("model-a", fingerprint, {"modules": ["m"]})
+
+    assert cache.lookup("model-b", fingerprint) is None
+    assert cache.lookup("model-a", fingerprint) == ({"modules": ["m"]}, 1.0)
+
+
+def test_index_keeps_newest_entries(tmp_path):
+    """索引超过条目上限时淘汰最早的条目"""
+    cache = ResultCache(str(tmp_path), max_entries=2)
+    for i in range(3):
+        cache.add("model", document_fingerprint(f"文档{i}"), {"modules": [i]})
+
+    assert cache.lookup("model", document_fingerprint("文档0")) is None
+    assert cache.lookup("model", document_fingerprint("文档2")) == ({"modules": [2]}, 1.0)
@@ -0,0 +1,30 @@
+"""
+任务状态存储测试
+"""
+
+from src.ai_testcase_gen import task_store
+from src.ai_testcase_gen.task_store import InMemoryTaskStore
+
+
+def test_update_merges_fields():
+    """更新只覆盖指定字段，task_id 字段可与参数同名"""
+    store = InMemoryTaskStore(ttl=60)
+    store.update("t1", task_id="t1", status="pending", progress=0)
+    store.update("t1", status="processing")
+
+    assert store.get("t1") == {"task_id": "t1", "status": "processing", "progress": 0}
+    assert store.get("missing") is None
+
+
+def test_expired_task_not_returned(monkeypatch):
+    """过期任务读取时返回None"""
+    now = [1000.0]
+    monkeypatch.setattr(task_store.time, "time", lambda: now[0])
+
+    store = InMemoryTaskStore(ttl=10)
+    store.update("t1", status="pending")
+    now[0] += 5
+    assert store.get("t1") == {"status": "pending"}
+
+    now[0] += 10
+    assert store.get("t1") is None
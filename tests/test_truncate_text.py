@@ -0,0 +1,67 @@
+"""
+输入文本截断测试
+"""
+
+from src.ai_testcase_gen import generator
+from src.ai_testcase_gen.generator import _truncate_text
+
+
+class _CharEncoding:
+    """每个字符计为一个token的简易tokenizer"""
+
+    def encode(self, text, disallowed_special=()):
+        return list(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+def test_overflowing_paragraph_keeps_prefix_by_chars(monkeypatch):
+    """按字符截断：放不下的段落保留前缀，用满预算"""
+    monkeypatch.setattr(generator, "_get_encoding", lambda model: None)
+    text = "用户管理\n" + "a" * 10000
+
+    result = _truncate_text(text, max_tokens=6000, max_chars=8000)
+    assert len(result) == 8000
+    assert result == "用户管理\n" + "a" * 7995
+
+
+def test_overflowing_paragraph_keeps_prefix_by_tokens(monkeypatch):
+    """按token截断：放不下的段落保留前缀，后续段落丢弃"""
+    monkeypatch.setattr(generator, "_get_encoding", lambda model: _CharEncoding())
+    text = "标题\n" + "b" * 100 + "\n结尾"
+
+    assert _truncate_text(text, max_tokens=10, max_chars=10000) == "标题\n" + "b" * 7
+
+
+def test_text_within_budget_unchanged(monkeypatch):
+    """未超出预算时原样返回"""
+    monkeypatch.setattr(generator, "_get_encoding", lambda model: _CharEncoding())
+    assert _truncate_text("第一段\n第二段", max_tokens=100, max_chars=100) == "第一段\n第二段"
+
+
+def test_failed_tokenizer_load_is_cached(monkeypatch, caplog):
+    """tokenizer加载失败只尝试和告警一次，不同模型共用结果"""
+    calls = []
+
+    class _OfflineTiktoken:
+        @staticmethod
+        def encoding_for_model(model):
+            raise KeyError(model)
+
+        @staticmethod
+        def get_encoding(name):
+            calls.append(name)
+            raise ConnectionError("offline")
+
+    monkeypatch.setattr(generator, "tiktoken", _OfflineTiktoken)
+    generator._get_encoding.cache_clear()
+    generator._fallback_encoding.cache_clear()
+    try:
+        for model in ("model-a", "model-b", "model-a"):
+            assert generator._get_encoding(model) is None
+        assert calls == ["cl100k_base"]
+        assert caplog.text.count("加载tokenizer失败") == 1
+    finally:
+        generator._get_encoding.cache_clear()
+        generator._fallback_encoding.cache_clear()
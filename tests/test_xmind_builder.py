@@ -0,0 +1,53 @@
+"""
+XMind构建辅助函数测试
+"""
+
+import pytest
+from src.ai_testcase_gen.xmind_builder import XMindBuilder, _bucket_by_level, _normalize_listfield
+
+
+def test_normalize_listfield_splits_strings():
+    """分号分隔的字符串拆分为列表，去掉空白和空项"""
+    assert _normalize_listfield("假设1; 假设2;;  ") == ["假设1", "假设2"]
+    assert _normalize_listfield("") == []
+
+
+def test_normalize_listfield_keeps_lists():
+    """数组原样转为列表，None 转为空列表"""
+    assert _normalize_listfield(["a", "b"]) == ["a", "b"]
+    assert _normalize_listfield(("a",)) == ["a"]
+    assert _normalize_listfield(None) == []
+
+
+def test_bucket_by_level_preserves_order():
+    """按级别分组，组内保持原有顺序"""
+    items = [
+        {"id": 1, "priority": "high"},
+        {"id": 2, "priority": "low"},
+        {"id": 3, "priority": "medium"},
+        {"id": 4, "priority": "high"},
+    ]
+    buckets = _bucket_by_level(items, "priority")
+    assert [i["id"] for i in buckets["high"]] == [1, 4]
+    assert [i["id"] for i in buckets["medium"]] == [3]
+    assert [i["id"] for i in buckets["low"]] == [2]
+
+
+def test_bucket_by_level_unknown_goes_low():
+    """缺失或无法识别的级别归入low"""
+    buckets = _bucket_by_level([{"severity": "critical"}, {}], "severity")
+    assert len(buckets["low"]) == 2
+    assert buckets["high"] == [] and buckets["medium"] == []
+
+
+def test_case_notes_sections():
+    """备注各段之间空一行，开头没有多余的换行"""
+    pytest.importorskip("xmind")
+    builder = XMindBuilder()
+
+    notes = builder._build_case_notes_v2(
+        {"preconditions": "已登录", "test_steps": ["打开", "提交"], "assumptions": ["默认分页"]},
+        "assumed"
+    )
+    assert notes == "🔧 前置条件：已登录\n\n👣 测试步骤：\n  1. 打开\n  2. 提交\n\n💡 测试假设：\n  ▸ 默认分页"
+    assert builder._build_case_notes_v2({}, "clear") == ""